@@ -1,7 +1,13 @@
 #!/usr/bin/env python3
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+import atexit
 import os
-from controller import process_single_song, process_playlist, create_song_json
+import json
+import shutil
+import tempfile
+from controller import process_single_song, process_playlist
+from jobs import JobManager
+from search_cache import SearchCache, DEFAULT_CACHE_FILE
 from werkzeug.utils import secure_filename
 from queue import Queue
 import threading
@@ -9,12 +15,31 @@ import threading
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# Every job runs in its own workspace, so several can run at once
+app.config['JOB_WORKERS'] = 4
 
-def save_tracklist(content, filename):
+# Seconds between keep-alive comments on idle event streams
+app.config['EVENT_KEEPALIVE'] = 15
+
+# Search results are shared by all jobs, so repeated songs are not searched again
+app.config['SEARCH_CACHE_FILE'] = DEFAULT_CACHE_FILE
+
+jobs = JobManager(max_workers=app.config['JOB_WORKERS'])
+search_cache = SearchCache(app.config['SEARCH_CACHE_FILE'])
+# Write the cache hits that are still buffered when the server stops
+atexit.register(search_cache.close)
+
+def create_workspace():
+    """Create a uniquely named scratch directory for a job"""
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    return tempfile.mkdtemp(prefix='job_', dir=app.config['UPLOAD_FOLDER'])
+
+def save_tracklist(content, filename, directory=None):
     """Save tracklist content to a file"""
-    if not os.path.exists(app.config['UPLOAD_FOLDER']):
-        os.makedirs(app.config['UPLOAD_FOLDER'])
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(filename))
+    directory = directory or app.config['UPLOAD_FOLDER']
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    filepath = os.path.join(directory, secure_filename(filename))
     with open(filepath, 'w', encoding='utf-8') as f:
         f.write(content)
     return filepath
@@ -33,8 +58,8 @@ def download_song():
         if not song_name:
             return jsonify({'success': False, 'error': 'Song name is required'})
         
-        success = process_single_song(song_name, download_dir)
-        return jsonify({'success': success})
+        job = jobs.submit('single', process_single_song, song_name, download_dir, cache=search_cache)
+        return jsonify({'success': True, 'job_id': job.id})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -48,19 +73,69 @@ def download_tracklist():
         if not tracklist:
             return jsonify({'success': False, 'error': 'Tracklist is required'})
         
-        # Save tracklist to file
-        tracklist_file = save_tracklist(tracklist, 'tracklist.txt')
-        
-        try:
-            success = process_playlist(tracklist_file, 'songs.json', download_dir)
-            return jsonify({'success': success})
-        finally:
-            # Cleanup tracklist file
-            if os.path.exists(tracklist_file):
-                os.remove(tracklist_file)
+        job = jobs.submit('tracklist', run_tracklist, tracklist, download_dir)
+        return jsonify({'success': True, 'job_id': job.id})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+def run_tracklist(tracklist, download_dir, progress=None):
+    """Runs the tracklist pipeline in a background job"""
+    # Save tracklist and song list in a workspace private to this job
+    workspace = create_workspace()
+    tracklist_file = save_tracklist(tracklist, 'tracklist.txt', workspace)
+    songs_json = os.path.join(workspace, 'songs.json')
+    
+    try:
+        return process_playlist(tracklist_file, songs_json, download_dir, cache=search_cache, progress=progress)
+    finally:
+        # Cleanup workspace
+        shutil.rmtree(workspace, ignore_errors=True)
+
+@app.route('/progress')
+@app.route('/progress/<job_id>')
+def progress(job_id=None):
+    job = jobs.get(job_id) if job_id else jobs.latest()
+    if job is None:
+        if job_id:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        return jsonify({'status': 'idle', 'current_task': None, 'total_songs': 0,
+                        'completed_songs': 0, 'current_song': ''})
+    return jsonify(job.to_dict())
+
+@app.route('/events/<job_id>')
+def events(job_id):
+    """Streams job progress as server-sent events until the job finishes"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+    # Resume after the last event the browser saw when it reconnects
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', -1))
+    except ValueError:
+        # Malformed header from a client or proxy, replay from the start
+        last_event_id = -1
+    keepalive = app.config['EVENT_KEEPALIVE']
+
+    def stream():
+        after_id = last_event_id
+        # Send the current state first so new watchers start in sync
+        yield f"event: progress\ndata: {json.dumps({'job': job.to_dict(include_songs=False)})}\n\n"
+        while True:
+            new_events, finished = job.wait_for_events(after_id, keepalive)
+            for event in new_events:
+                after_id = event['id']
+                data = {'event': event, 'job': job.to_dict(include_songs=False)}
+                yield f"id: {event['id']}\nevent: progress\ndata: {json.dumps(data)}\n\n"
+            if finished and not new_events:
+                yield f"event: end\ndata: {json.dumps({'job': job.to_dict()})}\n\n"
+                return
+            if not new_events:
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/download_playlist', methods=['POST'])
 def download_playlist():
     playlist_url = request.form.get('playlist_url')
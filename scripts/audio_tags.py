@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+import re
+import base64
+import mutagen
+from abc import ABC, abstractmethod
+from mutagen.id3 import ID3, Frames, APIC, WOAR, SYLT, USLT
+from mutagen.flac import Picture
+from mutagen.mp4 import MP4Tags, MP4Cover, MP4FreeForm
+from mutagen._vorbis import VComment
+
+# Song metadata is handled as ID3 frames everywhere. Files stored in other
+# containers (FLAC, Opus, Vorbis, M4A) are read and written through an adapter
+# that maps the frames used by the downloaders to the container's native tags.
+
+VORBIS_KEYS = {
+    "TIT2": "title",
+    "TPE1": "artist",
+    "TALB": "album",
+    "TRCK": "tracknumber",
+    "TDRC": "date",
+    "WOAR": "website",
+    "USLT": "lyrics",
+    "SYLT": "syncedlyrics",
+}
+
+MP4_KEYS = {
+    "TIT2": "\xa9nam",
+    "TPE1": "\xa9ART",
+    "TALB": "\xa9alb",
+    "TRCK": "trkn",
+    "TDRC": "\xa9day",
+    "WOAR": "----:com.apple.iTunes:WOAR",
+    "USLT": "\xa9lyr",
+    "SYLT": "----:com.apple.iTunes:SYNCEDLYRICS",
+    "APIC": "covr",
+}
+
+LRC_LINE_RE = re.compile(r"^\[(\d+):(\d+(?:\.\d+)?)\](.*)$")
+
+def to_lrc(synced_lyrics):
+    # SYLT text is a list of (text, milliseconds)
+    return "\n".join(f"[{ms // 60000:02d}:{ms % 60000 / 1000:06.3f}]{text}" for text, ms in synced_lyrics)
+
+def from_lrc(lrc):
+    synced_lyrics = []
+    for line in lrc.splitlines():
+        match = LRC_LINE_RE.match(line)
+        if match:
+            minutes, seconds, text = match.groups()
+            synced_lyrics.append((text, int(minutes) * 60000 + round(float(seconds) * 1000)))
+    return synced_lyrics
+
+class ID3Tags:
+    """ID3 tags of an MP3, WAV or AIFF file."""
+
+    def __init__(self, audio):
+        self.audio = audio
+        self.modified = False
+
+    def getall(self, key):
+        return self.audio.tags.getall(key)
+
+    def get(self, key, default=None):
+        return self.audio.tags.get(key, default)
+
+    def add(self, frame):
+        self.audio.tags.add(frame)
+        self.modified = True
+
+    def delall(self, key):
+        self.audio.tags.delall(key)
+        self.modified = True
+
+    def save(self, **kwargs):
+        self.audio.save(**kwargs)
+
+class NativeTags(ABC):
+    """
+    ID3 frame view of tags stored in a container's native format.
+
+    Only the frames written by the downloaders are supported, other frames
+    are ignored when added and never returned. Subclasses implement the
+    abstract methods to read and write the container's tags.
+    """
+
+    def __init__(self, audio, keys):
+        self.audio = audio
+        self.keys = keys
+        self.modified = False
+
+    @abstractmethod
+    def _get_values(self, frame_id):
+        """Returns the native values stored for an ID3 frame id."""
+
+    @abstractmethod
+    def _set_values(self, frame_id, values):
+        """Replaces the native values stored for an ID3 frame id."""
+
+    @abstractmethod
+    def _get_pictures(self):
+        """Returns the cover pictures as APIC frames."""
+
+    @abstractmethod
+    def _set_picture(self, frame):
+        """Stores an APIC frame as the cover picture."""
+
+    def getall(self, key):
+        frame_id = key.split(":")[0]
+        if frame_id == "APIC":
+            return self._get_pictures()
+        if frame_id not in self.keys:
+            return []
+
+        values = self._get_values(frame_id)
+        if not values:
+            return []
+        if frame_id == "WOAR":
+            return [WOAR(url=value) for value in values]
+        if frame_id == "SYLT":
+            return [SYLT(encoding=3, format=2, type=1, text=from_lrc(value)) for value in values]
+        if frame_id == "USLT":
+            return [USLT(encoding=3, text=value) for value in values]
+        return [Frames[frame_id](encoding=3, text=values)]
+
+    def get(self, key, default=None):
+        frames = self.getall(key)
+        return frames[0] if frames else default
+
+    def add(self, frame):
+        frame_id = frame.FrameID
+        self.modified = True
+        if frame_id == "APIC":
+            self._set_picture(frame)
+        elif frame_id not in self.keys:
+            return
+        elif frame_id == "WOAR":
+            self._set_values(frame_id, [frame.url])
+        elif frame_id == "SYLT":
+            self._set_values(frame_id, [to_lrc(frame.text)])
+        elif frame_id == "USLT":
+            self._set_values(frame_id, [frame.text])
+        else:
+            self._set_values(frame_id, [str(text) for text in frame.text])
+
+    def delall(self, key):
+        frame_id = key.split(":")[0]
+        self.modified = True
+        if frame_id == "APIC":
+            self._set_picture(None)
+        elif frame_id in self.keys:
+            self._set_values(frame_id, [])
+
+    def save(self, padding=None, **kwargs):
+        # ID3 specific save options such as v2_version do not apply
+        self.audio.save(padding=padding)
+
+class VorbisTags(NativeTags):
+    """Vorbis comments of a FLAC, Opus or Ogg Vorbis file."""
+
+    def __init__(self, audio):
+        super().__init__(audio, VORBIS_KEYS)
+
+    def _get_values(self, frame_id):
+        return self.audio.tags.get(self.keys[frame_id], [])
+
+    def _set_values(self, frame_id, values):
+        self._set_comment(self.keys[frame_id], values)
+
+    def _set_comment(self, key, values):
+        if values:
+            self.audio.tags[key] = values
+        elif key in self.audio.tags:
+            del self.audio.tags[key]
+
+    def _get_pictures(self):
+        if hasattr(self.audio, "pictures"):
+            pictures = self.audio.pictures
+        else:
+            pictures = [Picture(base64.b64decode(data)) for data in self.audio.tags.get("metadata_block_picture", [])]
+        return [APIC(encoding=3, mime=picture.mime, type=picture.type, desc=picture.desc, data=picture.data) for picture in pictures]
+
+    def _set_picture(self, frame):
+        pictures = []
+        if frame is not None:
+            picture = Picture()
+            picture.type = frame.type
+            picture.mime = frame.mime
+            picture.desc = frame.desc
+            picture.data = frame.data
+            pictures.append(picture)
+
+        if hasattr(self.audio, "add_picture"):
+            # FLAC stores pictures in their own metadata blocks
+            self.audio.clear_pictures()
+            for picture in pictures:
+                self.audio.add_picture(picture)
+        else:
+            self._set_comment("metadata_block_picture", [base64.b64encode(picture.write()).decode("ascii") for picture in pictures])
+
+class ITunesTags(NativeTags):
+    """iTunes style tags of an M4A file."""
+
+    def __init__(self, audio):
+        super().__init__(audio, MP4_KEYS)
+
+    def _get_values(self, frame_id):
+        key = self.keys[frame_id]
+        values = self.audio.tags.get(key, [])
+        if frame_id == "TRCK":
+            return [str(track) for track, _ in values]
+        if key.startswith("----"):
+            return [bytes(value).decode("utf-8") for value in values]
+        return list(values)
+
+    def _set_values(self, frame_id, values):
+        key = self.keys[frame_id]
+        if not values:
+            if key in self.audio.tags:
+                del self.audio.tags[key]
+        elif frame_id == "TRCK":
+            self.audio.tags[key] = [(int(values[0]), 0)]
+        elif key.startswith("----"):
+            self.audio.tags[key] = [MP4FreeForm(value.encode("utf-8")) for value in values]
+        else:
+            self.audio.tags[key] = values
+
+    def _get_pictures(self):
+        return [APIC(encoding=3, mime="image/png" if cover.imageformat == MP4Cover.FORMAT_PNG else "image/jpeg",
+                     type=3, desc="Front cover", data=bytes(cover))
+                for cover in self.audio.tags.get(self.keys["APIC"], [])]
+
+    def _set_picture(self, frame):
+        key = self.keys["APIC"]
+        if frame is None:
+            if key in self.audio.tags:
+                del self.audio.tags[key]
+            return
+        image_format = MP4Cover.FORMAT_PNG if frame.mime == "image/png" else MP4Cover.FORMAT_JPEG
+        self.audio.tags[key] = [MP4Cover(frame.data, imageformat=image_format)]
+
+def open_tags(file_path, create=False):
+    # Returns the tags of an audio file as ID3 frames, raising an error for
+    # files that are not audio or have no tags unless create is set
+    audio = mutagen.File(file_path)
+    if audio is None:
+        raise mutagen.MutagenError(f"Unsupported audio file '{file_path}'")
+    if audio.tags is None:
+        if not create:
+            raise mutagen.MutagenError(f"No tags found in '{file_path}'")
+        audio.add_tags()
+
+    if isinstance(audio.tags, ID3):
+        return ID3Tags(audio)
+    if isinstance(audio.tags, VComment):
+        return VorbisTags(audio)
+    if isinstance(audio.tags, MP4Tags):
+        return ITunesTags(audio)
+    raise mutagen.MutagenError(f"Unsupported tag format in '{file_path}'")
+
+def clear_tags(file_path):
+    # Removes every tag from an audio file, including FLAC pictures which are
+    # stored in their own metadata blocks
+    audio = mutagen.File(file_path)
+    if audio is None:
+        raise mutagen.MutagenError(f"Unsupported audio file '{file_path}'")
+    if hasattr(audio, "clear_pictures"):
+        audio.clear_pictures()
+        if audio.tags is None:
+            audio.save()
+    audio.delete()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Measures the cover art pipeline in cover_art against the previous approach.
+
+The previous approach decoded info_dict["thumbnail"] at full resolution,
+cropped it to 16:9 and then to a square, and encoded the result at the source
+resolution. yt-dlp ranks the WebP variant of a YouTube thumbnail above the JPEG
+one, so that thumbnail is a WebP. The new pipeline picks a thumbnail with
+select_thumbnail, which prefers the JPEG of the same size.
+
+Both paths are timed on a synthetic thumbnail (no network access), and the
+size of the resulting images is reported since it ends up in every APIC frame.
+The previous approach is also timed on the JPEG to show the cost of the
+thumbnail format separately.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFilter
+from cover_art import DEFAULT_COVER_SIZE, create_cover_image, select_thumbnail
+
+
+def create_thumbnail(width: int, height: int, image_format: str = "JPEG") -> bytes:
+    # Letterboxed noisy image so the encoder has realistic work to do
+    random.seed(0)
+    img = Image.new("RGB", (width, height))
+    draw = ImageDraw.Draw(img)
+    for _ in range(400):
+        x, y = random.randrange(width), random.randrange(height)
+        radius = random.randrange(10, max(width, height) // 6)
+        color = tuple(random.randrange(256) for _ in range(3))
+        draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=color)
+    img = img.filter(ImageFilter.GaussianBlur(2))
+    bar = height // 8
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([0, 0, width, bar], fill=(0, 0, 0))
+    draw.rectangle([0, height - bar, width, height], fill=(0, 0, 0))
+
+    with BytesIO() as f:
+        img.save(f, format=image_format, quality=90)
+        return f.getvalue()
+
+
+def create_cover_image_legacy(image_data: bytes, image_format: str) -> bytes:
+    img = Image.open(BytesIO(image_data))
+
+    # Ensure aspect ratio
+    target_ratio = [16, 9]
+    width, height = img.size
+    width_ratio = width / target_ratio[0]
+    height_ratio = height / target_ratio[1]
+    if width_ratio > height_ratio:
+        half_width = width / 2
+        min_offset = (height_ratio * target_ratio[0]) / 2
+        img = img.crop([half_width - min_offset, 0, half_width + min_offset, height])
+    elif height_ratio > width_ratio:
+        half_height = height / 2
+        min_offset = (width_ratio * target_ratio[1]) / 2
+        img = img.crop([0, half_height - min_offset, width, half_height + min_offset])
+
+    # Crop to square
+    width, height = img.size
+    half_width = width / 2
+    half_height = height / 2
+    min_offset = min(half_width, half_height)
+    img = img.crop([half_width - min_offset, half_height - min_offset, half_width + min_offset, half_height + min_offset])
+
+    with BytesIO() as f:
+        img.convert("RGB").save(f, format=image_format)
+        return f.getvalue()
+
+
+def bench(create, iterations: int) -> (float, int):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        data = create()
+    return time.perf_counter() - start, len(data)
+
+
+def best_of(rounds: int, *creates, iterations: int) -> list:
+    # Rounds alternate between variants so background load affects them equally,
+    # the fastest round of each variant is reported
+    results = [(float("inf"), 0)] * len(creates)
+    for _ in range(rounds):
+        results = [min(result, bench(create, iterations), key=lambda r: r[0])
+                   for result, create in zip(results, creates)]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cover art processing")
+    parser.add_argument("-n", "--iterations", type=int, default=50,
+                        help="Number of covers to create per variant (default: 50)")
+    parser.add_argument("--width", type=int, default=1280, help="Thumbnail width (default: 1280)")
+    parser.add_argument("--height", type=int, default=720, help="Thumbnail height (default: 720)")
+    parser.add_argument("-r", "--rounds", type=int, default=5,
+                        help="Rounds per variant, the fastest is reported (default: 5)")
+    parser.add_argument("-s", "--cover-size", type=int, default=DEFAULT_COVER_SIZE,
+                        help=f"Maximum cover edge for the new pipeline, 0 keeps the source size (default: {DEFAULT_COVER_SIZE})")
+    parser.add_argument("-f", "--image-format", type=str, default="jpeg", help="Cover image format (default: jpeg)")
+    args = parser.parse_args()
+
+    # Same thumbnail in both formats, listed the way yt-dlp lists YouTube thumbnails
+    thumbnails = {
+        "https://i.ytimg.com/vi_webp/id/maxresdefault.webp": create_thumbnail(args.width, args.height, "WEBP"),
+        "https://i.ytimg.com/vi/id/maxresdefault.jpg": create_thumbnail(args.width, args.height, "JPEG"),
+    }
+    webp_url, jpeg_url = thumbnails
+    info_dict = {
+        "thumbnail": webp_url,
+        "thumbnails": [{"url": url, "width": args.width, "height": args.height} for url in thumbnails],
+    }
+    print(f"Thumbnail: {args.width}x{args.height}, WebP {len(thumbnails[webp_url]) / 1024:.1f} KiB, "
+          f"JPEG {len(thumbnails[jpeg_url]) / 1024:.1f} KiB, {args.iterations} covers")
+
+    (legacy_time, legacy_size), (legacy_jpeg_time, _), (new_time, new_size) = best_of(
+        args.rounds,
+        lambda: create_cover_image_legacy(thumbnails[info_dict["thumbnail"]], args.image_format),
+        lambda: create_cover_image_legacy(thumbnails[jpeg_url], args.image_format),
+        lambda: create_cover_image(thumbnails[select_thumbnail(info_dict, args.cover_size)], args.image_format, args.cover_size),
+        iterations=args.iterations)
+
+    print(f"- Full decode of WebP, two crops: {legacy_time / args.iterations * 1000:.2f}ms per cover, {legacy_size / 1024:.1f} KiB")
+    print(f"- Full decode of JPEG, two crops: {legacy_jpeg_time / args.iterations * 1000:.2f}ms per cover")
+    print(f"- Selected thumbnail, cover_size {args.cover_size}: {new_time / args.iterations * 1000:.2f}ms per cover, {new_size / 1024:.1f} KiB")
+    print(f"- Speedup: {legacy_time / new_time:.2f}x ({legacy_jpeg_time / new_time:.2f}x on the same JPEG), "
+          f"cover size reduced by {(1 - new_size / legacy_size) * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Measures the per-song YoutubeDL setup overhead saved by ytdl_pool.
+
+By default only session setup is timed (no network access), comparing a new
+YoutubeDL per track against pooled sessions for a playlist of --tracks songs.
+Pass --link to also time metadata extraction for a real video, which includes
+the HTTP connection setup that pooled sessions keep alive.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from yt_dlp import YoutubeDL
+from ytdl_pool import FilePathCollector, YoutubeDLPool
+
+
+def get_options(track_num: int, cookie_file: str) -> dict:
+    return {
+        "quiet": True,
+        "geo_bypass": True,
+        "outtmpl": f"{track_num}. %(title)s-%(id)s.%(ext)s",
+        "format": "bestaudio/best",
+        "cookiefile": cookie_file or None,
+        "postprocessors": [{
+            "key": "FFmpegExtractAudio",
+            "preferredcodec": "wav",
+            "preferredquality": "0",
+        }]
+    }
+
+
+def bench_fresh(tracks: int, cookie_file: str, link: str = None) -> float:
+    start = time.perf_counter()
+    for track_num in range(1, tracks + 1):
+        with YoutubeDL(get_options(track_num, cookie_file)) as ytdl:
+            ytdl.add_post_processor(FilePathCollector())
+            if link:
+                ytdl.extract_info(link, download=False)
+    return time.perf_counter() - start
+
+
+def bench_pooled(tracks: int, cookie_file: str, link: str = None) -> float:
+    pool = YoutubeDLPool()
+    start = time.perf_counter()
+    for track_num in range(1, tracks + 1):
+        ytdl = pool.get(get_options(track_num, cookie_file))
+        if link:
+            ytdl.extract_info(link, download=False)
+    pool.close_all()
+    return time.perf_counter() - start
+
+
+def report(label: str, tracks: int, fresh: float, pooled: float) -> None:
+    print(f"{label} ({tracks} tracks)")
+    print(f"- New YoutubeDL per song: {fresh:.3f}s total, {fresh / tracks * 1000:.2f}ms per song")
+    print(f"- Pooled sessions:        {pooled:.3f}s total, {pooled / tracks * 1000:.2f}ms per song")
+    print(f"- Saved per song:         {(fresh - pooled) / tracks * 1000:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pooled YoutubeDL sessions")
+    parser.add_argument("-n", "--tracks", type=int, default=500,
+                        help="Number of tracks to simulate (default: 500)")
+    parser.add_argument("--cookie-file", type=str, default="",
+                        help="Cookie file to load for every session")
+    parser.add_argument("--link", type=str, default=None,
+                        help="Video link to extract for every track (requires network)")
+    parser.add_argument("--link-tracks", type=int, default=10,
+                        help="Number of tracks to extract when --link is given (default: 10)")
+    args = parser.parse_args()
+
+    report("Session setup", args.tracks,
+           bench_fresh(args.tracks, args.cookie_file),
+           bench_pooled(args.tracks, args.cookie_file))
+
+    if args.link:
+        print()
+        report("Metadata extraction", args.link_tracks,
+               bench_fresh(args.link_tracks, args.cookie_file, args.link),
+               bench_pooled(args.link_tracks, args.cookie_file, args.link))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+from concurrent.futures import Future
+from yt_dlp import YoutubeDL
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, files are always copied there
+    fcntl = None
+
+DEFAULT_STORE_FILE = os.path.join(Path.home(), ".cache", "youtube_music_playlist_downloader", "content.db")
+
+# Linux ioctl that makes a file share the data blocks of another (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+# Info dict fields that are large and not needed to tag or name a song
+UNUSED_INFO_KEYS = ["formats", "automatic_captions", "heatmap", "http_headers", "fragments"]
+
+def get_settings_key(config):
+    # Songs downloaded with the same audio settings have identical audio
+    return json.dumps([config["audio_format"], config["audio_codec"], config["audio_quality"]])
+
+def sanitize_info(info_dict):
+    info_dict = YoutubeDL.sanitize_info(info_dict, remove_private_keys=True)
+    for key in UNUSED_INFO_KEYS:
+        info_dict.pop(key, None)
+    return info_dict
+
+def clone_file(src, dst):
+    # Returns "reflink" if dst shares the data blocks of src, otherwise "copy".
+    # Files cannot be hardlinked because every playlist writes its own tags into the file.
+    if fcntl is not None:
+        try:
+            with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+                fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+            return "reflink"
+        except OSError:
+            # File system does not support reflinks or src and dst are on different devices
+            pass
+    shutil.copyfile(src, dst)
+    return "copy"
+
+class ContentStore:
+    """
+    Persistent SQLite index of downloaded songs shared by all playlists.
+
+    Entries are keyed by video id and audio settings and list the library
+    files holding that audio, along with the info dict captured when it was
+    downloaded. Paths go stale when files are renamed or removed, so callers
+    check a source before using it and remove it otherwise.
+
+    claim() and release() make concurrent syncs of the same song wait for
+    the first download instead of downloading it again.
+    """
+
+    def __init__(self, db_file: str = DEFAULT_STORE_FILE):
+        self.db_file = db_file
+        self.reflinks = 0
+        self.copies = 0
+        self.lock = threading.Lock()
+        self.connection = None
+        self.in_flight = {}
+
+    def _connect(self):
+        # Connect lazily so the store file is only created once songs are added
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+            self.connection = sqlite3.connect(self.db_file, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS sources ("
+                "video_id TEXT NOT NULL, "
+                "settings TEXT NOT NULL, "
+                "path TEXT NOT NULL, "
+                "added REAL NOT NULL, "
+                "PRIMARY KEY (video_id, settings, path))"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS info ("
+                "video_id TEXT NOT NULL, "
+                "settings TEXT NOT NULL, "
+                "info TEXT NOT NULL, "
+                "PRIMARY KEY (video_id, settings))"
+            )
+            self.connection.commit()
+        return self.connection
+
+    def find(self, video_id, settings):
+        # Returns (source_paths, info_dict) with the most recently added paths first,
+        # info_dict is None if the song was not downloaded since the store was created
+        with self.lock:
+            try:
+                connection = self._connect()
+                paths = [row[0] for row in connection.execute(
+                    "SELECT path FROM sources WHERE video_id = ? AND settings = ? ORDER BY added DESC", (video_id, settings)
+                )]
+                row = connection.execute(
+                    "SELECT info FROM info WHERE video_id = ? AND settings = ?", (video_id, settings)
+                ).fetchone()
+            except sqlite3.DatabaseError as e:
+                print(f"Unable to read content store: {e}")
+                return [], None
+        return paths, None if row is None else json.loads(row[0])
+
+    def add(self, video_id, settings, file_path, info_dict=None):
+        with self.lock:
+            try:
+                connection = self._connect()
+                connection.execute(
+                    "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                    (video_id, settings, os.path.abspath(file_path), time.time())
+                )
+                if info_dict is not None:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO info VALUES (?, ?, ?)",
+                        (video_id, settings, json.dumps(sanitize_info(info_dict)))
+                    )
+                connection.commit()
+            except sqlite3.DatabaseError as e:
+                print(f"Unable to add song to content store: {e}")
+
+    def add_all(self, sources):
+        # Indexes existing library files from a list of (video_id, settings, file_path),
+        # keeping the order in which sources were first added
+        with self.lock:
+            try:
+                connection = self._connect()
+                now = time.time()
+                connection.executemany(
+                    "INSERT OR IGNORE INTO sources VALUES (?, ?, ?, ?)",
+                    [(video_id, settings, os.path.abspath(file_path), now) for video_id, settings, file_path in sources]
+                )
+                connection.commit()
+            except sqlite3.DatabaseError as e:
+                print(f"Unable to add songs to content store: {e}")
+
+    def remove(self, video_id, settings, file_path):
+        with self.lock:
+            try:
+                connection = self._connect()
+                connection.execute(
+                    "DELETE FROM sources WHERE video_id = ? AND settings = ? AND path = ?",
+                    (video_id, settings, file_path)
+                )
+                connection.commit()
+            except sqlite3.DatabaseError as e:
+                print(f"Unable to remove song from content store: {e}")
+
+    def claim(self, video_id, settings):
+        # Returns None if the caller should download the song and call release() afterwards,
+        # otherwise a future that resolves once the download in progress has finished
+        with self.lock:
+            future = self.in_flight.get((video_id, settings))
+            if future is not None:
+                return future
+            self.in_flight[(video_id, settings)] = Future()
+            return None
+
+    def release(self, video_id, settings):
+        with self.lock:
+            future = self.in_flight.pop((video_id, settings), None)
+        if future is not None:
+            future.set_result(None)
+
+    def clone(self, src, dst):
+        method = clone_file(src, dst)
+        with self.lock:
+            if method == "reflink":
+                self.reflinks += 1
+            else:
+                self.copies += 1
+        return method
+
+    def stats(self):
+        return f"{self.reflinks} reflinked, {self.copies} copied"
+
+shared_content_store = ContentStore()
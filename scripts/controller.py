@@ -1,58 +1,77 @@
 #!/usr/bin/env python3
 import argparse
+import hashlib
 import os
+import sys
 from json_processor import PlaylistProcessor
 from youtube_searcher import YouTubeSearcher
 from main import DownloadManager
+from pipeline import StreamingPipeline
+from search_cache import SearchCache, DEFAULT_CACHE_FILE
+from journal import Journal
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO
 import json
 
-def create_song_json(song_name: str, output_file: str = "temp_songs.json") -> bool:
-    """Create a temporary JSON file for single song"""
-    try:
-        song_data = {
-            "songs": [
-                {
-                    "name": song_name,
-                    "youtube_id": ""
-                }
-            ]
-        }
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(song_data, f, indent=2, ensure_ascii=False)
-        return True
-    except Exception as e:
-        print(f"Error creating song JSON: {e}")
-        return False
+def read_song_names(song_args: List[str], stdin: TextIO = sys.stdin) -> Iterator[str]:
+    """Yields song names, expanding '-' entries into lines read from stdin as they arrive"""
+    for song_arg in song_args:
+        if song_arg == '-':
+            for line in stdin:
+                if line.strip():
+                    yield line.strip()
+        else:
+            yield song_arg
+
+def process_songs(song_names: Iterable[str], download_dir: str = "downloads", threads: int = 3,
+                  workers: int = 1, rate: float = 1.0, burst: int = 1,
+                  cache: Optional[SearchCache] = None, refresh: bool = False,
+                  audio_codec: str = "wav",
+                  progress: Optional[Callable[..., None]] = None) -> bool:
+    """Pipeline for downloading a batch of songs entirely in memory, searching each as it is read"""
+    def queue_songs():
+        for song_name in song_names:
+            if progress is not None:
+                progress(song_name, "queued")
+            yield {"name": song_name, "youtube_id": ""}
 
-def process_single_song(song_name: str, download_dir: str = "downloads") -> bool:
-    """Pipeline for downloading a single song"""
-    temp_json = "temp_songs.json"
     try:
-        # Create JSON for single song
-        if not create_song_json(song_name, temp_json):
-            return False
 
-        # Search YouTube
-        searcher = YouTubeSearcher(temp_json, max_threads=1)
-        searcher.update_json_with_ids()
-
-        # Download song
-        manager = DownloadManager(temp_json, download_dir)
-        manager.download_songs()
+        # One searcher and one download pool serve the whole batch
+        searcher = YouTubeSearcher(max_threads=threads, requests_per_second=rate, burst=burst,
+                                   cache=cache, refresh=refresh, progress=progress)
+        manager = DownloadManager(None, download_dir, workers, progress, audio_codec)
+        pipeline = StreamingPipeline(searcher, manager, search_threads=threads,
+                                     download_workers=workers)
+        pipeline.run(queue_songs())
 
         return True
 
     except Exception as e:
-        print(f"Error processing song: {e}")
+        print(f"Error processing songs: {e}")
         return False
-    finally:
-        # Cleanup temp file
-        if os.path.exists(temp_json):
-            os.remove(temp_json)
+
+def process_single_song(song_name: str, download_dir: str = "downloads",
+                        cache: Optional[SearchCache] = None, refresh: bool = False,
+                        audio_codec: str = "wav",
+                        progress: Optional[Callable[..., None]] = None) -> bool:
+    """Pipeline for downloading a single song"""
+    return process_songs([song_name], download_dir, threads=1, cache=cache,
+                         refresh=refresh, audio_codec=audio_codec, progress=progress)
+
+def get_playlist_fingerprint(songs: List[str], download_dir: str) -> str:
+    """Identifies a playlist run, a journal is only resumed by a run with the same fingerprint"""
+    data = json.dumps([os.path.abspath(download_dir), songs], ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
 
 def process_playlist(playlist_path: str, output_json: str = "songs.json", 
-                    download_dir: str = "downloads", threads: int = 3) -> bool:
+                    download_dir: str = "downloads", threads: int = 3,
+                    rate: float = 1.0, burst: int = 1,
+                    cache: Optional[SearchCache] = None, refresh: bool = False,
+                    stream: bool = False, workers: int = 1, audio_codec: str = "wav",
+                    progress: Optional[Callable[..., None]] = None) -> bool:
     """Pipeline for processing a playlist file"""
+    # Resolved IDs and finished downloads are journaled so an interrupted run resumes
+    journal = Journal(f"{output_json}.journal")
     try:
         # Process playlist to JSON
         processor = PlaylistProcessor(playlist_path, output_json)
@@ -60,44 +79,99 @@ def process_playlist(playlist_path: str, output_json: str = "songs.json",
         processor.save_to_json(songs)
         print(f"Processed {len(songs)} songs from playlist")
 
+        # A journal left by a run of another playlist into the same output is discarded
+        if journal.bind(get_playlist_fingerprint(songs, download_dir)):
+            print("Resuming interrupted run...")
+        if progress is not None:
+            for song in songs:
+                progress(song, "queued")
+
         # Search YouTube
-        searcher = YouTubeSearcher(output_json, max_threads=threads)
+        searcher = YouTubeSearcher(output_json, max_threads=threads,
+                                   requests_per_second=rate, burst=burst,
+                                   cache=cache, refresh=refresh, progress=progress,
+                                   journal=journal)
+
+        if stream:
+            # Download each song as soon as its YouTube ID is found
+            manager = DownloadManager(output_json, download_dir, workers, progress, audio_codec, journal)
+            pipeline = StreamingPipeline(searcher, manager, search_threads=threads,
+                                         download_workers=workers)
+            song_entries = pipeline.run(manager.load_songs())
+            with open(output_json, 'w', encoding='utf-8') as f:
+                json.dump({"songs": [{"name": song['name'], "youtube_id": song['youtube_id']} for song in song_entries]},
+                          f, indent=2, ensure_ascii=False)
+            journal.close(remove=True)
+            return True
+
         searcher.update_json_with_ids()
 
         # Download songs
-        manager = DownloadManager(output_json, download_dir)
+        manager = DownloadManager(output_json, download_dir, workers, progress, audio_codec, journal)
         manager.download_songs()
 
+        journal.close(remove=True)
         return True
 
     except Exception as e:
         print(f"Error processing playlist: {e}")
+        journal.close()
         return False
 
 def main():
     parser = argparse.ArgumentParser(description="YouTube Music Downloader Controller")
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('-p', '--playlist', help='Path to playlist file')
-    group.add_argument('-s', '--song', help='Single song to download')
+    group.add_argument('-s', '--song', action='append',
+                      help="Song to download, may be repeated; '-' reads song names from stdin")
     
     parser.add_argument('-o', '--output', default='songs.json',
                       help='Output JSON file (for playlist only)')
     parser.add_argument('-d', '--dir', default='downloads',
                       help='Download directory')
     parser.add_argument('-t', '--threads', type=int, default=3,
-                      help='Number of search threads (for playlist only)')
+                      help='Number of search threads')
+    parser.add_argument('-r', '--rate', type=float, default=1.0,
+                      help='Maximum YouTube searches per second')
+    parser.add_argument('-b', '--burst', type=int, default=1,
+                      help='Number of searches allowed back-to-back before throttling')
+    parser.add_argument('--cache-file', default=DEFAULT_CACHE_FILE,
+                      help='Search cache file')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='Disable the search cache')
+    parser.add_argument('--refresh', action='store_true',
+                      help='Ignore cached search results and search YouTube again')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                      help='Number of concurrent downloads')
+    parser.add_argument('-c', '--codec', default='wav',
+                      help="Audio codec such as wav or flac, 'passthrough' keeps the source audio without transcoding")
+    parser.add_argument('--stream', action='store_true',
+                      help='Start downloading each song as soon as it is found (for playlist only)')
 
     args = parser.parse_args()
 
     # Create download directory if it doesn't exist
     os.makedirs(args.dir, exist_ok=True)
 
+    cache = None if args.no_cache else SearchCache(args.cache_file)
+
     if args.song:
-        print(f"Processing single song: {args.song}")
-        success = process_single_song(args.song, args.dir)
+        if '-' in args.song:
+            print("Processing songs from stdin")
+        elif len(args.song) == 1:
+            print(f"Processing single song: {args.song[0]}")
+        else:
+            print(f"Processing {len(args.song)} songs")
+        song_names = read_song_names(args.song)
+        success = process_songs(song_names, args.dir, args.threads, args.workers,
+                                args.rate, args.burst, cache, args.refresh, args.codec)
     else:
         print(f"Processing playlist: {args.playlist}")
-        success = process_playlist(args.playlist, args.output, args.dir, args.threads)
+        success = process_playlist(args.playlist, args.output, args.dir, args.threads,
+                                   args.rate, args.burst, cache, args.refresh, args.stream,
+                                   args.workers, args.codec)
+    if cache is not None:
+        cache.close()
 
     if success:
         print("Processing completed successfully!")
@@ -108,5 +182,4 @@ def main():
     return 0
 
 if __name__ == "__main__":
-    import sys
     sys.exit(main())
\ No newline at end of file
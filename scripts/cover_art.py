@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+from io import BytesIO
+from urllib.parse import urlparse
+from PIL import Image
+
+# Thumbnails are cropped to 16:9 to remove letterboxing, then to a centered square
+COVER_ASPECT_RATIO = (16, 9)
+
+# Maximum cover edge in pixels. YouTube's largest standard thumbnail gives a 720 pixel square,
+# which is kept as is, larger custom thumbnails are scaled down
+DEFAULT_COVER_SIZE = 1000
+
+def get_square_size(width, height):
+    # Side of the square left after the 16:9 crop and the square crop
+    return min(height, width * COVER_ASPECT_RATIO[1] / COVER_ASPECT_RATIO[0])
+
+def get_square_crop_box(width, height):
+    # Both crops are centered, so the final square is centered on the image
+    half_size = get_square_size(width, height) / 2
+    half_width = width / 2
+    half_height = height / 2
+    return (half_width - half_size, half_height - half_size, half_width + half_size, half_height + half_size)
+
+def is_jpeg(thumbnail):
+    # JPEG decodes several times faster than WebP and supports draft mode
+    return urlparse(thumbnail["url"]).path.lower().endswith((".jpg", ".jpeg"))
+
+def select_thumbnail(info_dict, cover_size):
+    # Picks the smallest thumbnail whose square crop is at least cover_size,
+    # otherwise the largest one available. JPEG is preferred over other formats
+    # of the same size, yt-dlp ranks WebP first
+    thumbnails = [
+        thumbnail for thumbnail in info_dict.get("thumbnails") or []
+        if thumbnail.get("url") and thumbnail.get("width") and thumbnail.get("height")
+    ]
+    if not thumbnails:
+        return info_dict.get("thumbnail")
+
+    def get_thumbnail_square_size(thumbnail):
+        return get_square_size(thumbnail["width"], thumbnail["height"])
+
+    if cover_size > 0:
+        large_enough = [thumbnail for thumbnail in thumbnails if get_thumbnail_square_size(thumbnail) >= cover_size]
+        if large_enough:
+            return min(large_enough, key=lambda thumbnail: (get_thumbnail_square_size(thumbnail), not is_jpeg(thumbnail)))["url"]
+    return max(thumbnails, key=lambda thumbnail: (get_thumbnail_square_size(thumbnail), is_jpeg(thumbnail)))["url"]
+
+def create_cover_image(image_data, image_format, cover_size=0):
+    # The centered square is resized so its edge is at most cover_size, 0 keeps the source size
+    img = Image.open(BytesIO(image_data))
+    width, height = img.size
+    resize = 0 < cover_size < get_square_size(width, height)
+
+    if resize and img.format == "JPEG":
+        # Let the JPEG decoder downscale by a power of two while keeping the square above cover_size
+        scale = cover_size / get_square_size(width, height)
+        img.draft(img.mode, (int(width * scale) + 1, int(height * scale) + 1))
+
+    box = get_square_crop_box(*img.size)
+    if resize:
+        # Crop and resize in a single resampling pass
+        img = img.resize((cover_size, cover_size), Image.LANCZOS, box=box)
+    else:
+        img = img.crop(box)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    with BytesIO() as f:
+        img.save(f, format=image_format)
+        return f.getvalue()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import os
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+DEFAULT_CACHE_DIR = os.path.join(Path.home(), ".cache", "youtube_music_playlist_downloader", "covers")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+class CoverArtCache:
+    """
+    On-disk cache of finished cover images shared by all playlists.
+
+    Entries are keyed by a digest of the thumbnail URL, the crop parameters and
+    the image format. Reads refresh an entry's mtime, and the least recently
+    used entries are evicted once the cache grows beyond max_bytes.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_key(url: str, crop: str, image_format: str) -> str:
+        return hashlib.sha256("\0".join([url, crop, image_format]).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Mark as recently used
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see partial images
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = sum(size for _, _, size in self._entries())
+            else:
+                self.total_bytes += len(data)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def get_or_create(self, url: str, crop: str, image_format: str, create: Callable[[], bytes]) -> bytes:
+        """Returns the cached cover for the parameters, creating and caching it if missing."""
+        key = self.get_key(url, crop, image_format)
+        data = self.get(key)
+        if data is None:
+            data = create()
+            try:
+                self.put(key, data)
+            except OSError as e:
+                print(f"Unable to cache cover image: {e}")
+        return data
+
+    def _entries(self):
+        entries = []
+        for root, _, file_names in os.walk(self.directory):
+            for file_name in file_names:
+                path = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def _evict(self) -> None:
+        # Remove least recently used entries until the cache is back to 90% of its limit
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for _, path, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+        self.total_bytes = total
+
+    def stats(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses"
+
+shared_cover_cache = CoverArtCache()
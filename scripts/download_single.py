@@ -1,30 +1,25 @@
 #!/usr/bin/env python3
 import os
 from typing import Tuple, List
-from yt_dlp import YoutubeDL, postprocessor
 from urllib.parse import urlparse, parse_qs
-from mutagen.id3 import ID3, WOAR, error
+from mutagen import MutagenError
+from mutagen.id3 import WOAR
+from audio_tags import open_tags
+from resilience import YOUTUBE_ENDPOINT, call_with_retry
+from transcoder import get_preferred_codec
+from ytdl_pool import DownloadListener, YoutubeDLPool, shared_pool
 import unittest
 
 
-class FilePathCollector(postprocessor.common.PostProcessor):
-    """Collects file paths during YouTube download processing."""
-    
-    def __init__(self):
-        super(FilePathCollector, self).__init__(None)
-        self.file_paths = []
-
-    def run(self, information):
-        self.file_paths.append(information['filepath'])
-        return [], information
-
-
 class YouTubeDownloader:
     """Handles downloading and processing of YouTube videos."""
     
-    def __init__(self, output_directory: str = None, output_template: str = None):
+    def __init__(self, output_directory: str = None, output_template: str = None,
+                 pool: YoutubeDLPool = None, audio_codec: str = "wav"):
         self.output_directory = output_directory or os.getcwd()
         self.output_template = output_template
+        self.pool = pool or shared_pool
+        self.audio_codec = audio_codec
     
     def _get_ytdl_options(self) -> dict:
         """Returns the options for yt-dlp."""
@@ -32,7 +27,7 @@ class YouTubeDownloader:
             "format": "bestaudio/best",
             "postprocessors": [{
                 "key": "FFmpegExtractAudio",
-                "preferredcodec": "wav",
+                "preferredcodec": get_preferred_codec(self.audio_codec),
                 "preferredquality": "0",
             }],
             "geo_bypass": True,
@@ -59,12 +54,12 @@ class YouTubeDownloader:
         return parse_qs(urlparse(url).query)[param][0]
 
     def _generate_metadata(self, file_path: str, link: str) -> None:
-        """Adds metadata to the downloaded MP3 file."""
+        """Adds metadata to the downloaded audio file in its container's tag format."""
         try:
-            tags = ID3(file_path)
+            tags = open_tags(file_path, create=True)
             tags.add(WOAR(encoding=3, url=link))
             tags.save(v2_version=3)
-        except error as e:
+        except MutagenError as e:
             print(f"Error adding metadata: {e}")
 
     def get_video_id(self, url: str) -> str:
@@ -73,21 +68,26 @@ class YouTubeDownloader:
             return self._get_url_path(url)
         return self._get_url_parameter(url, "v")
 
-    def download_video(self, video_id: str) -> Tuple[int, str]:
-        """Downloads a video and returns the result and file path."""
+    def download_video(self, video_id: str, listener: DownloadListener = None) -> Tuple[int, str]:
+        """
+        Downloads a video and returns the result and file path.
+        The listener receives "bytes", "transcoding" and "tagged" events.
+        """
         link = f"https://www.youtube.com/watch?v={video_id}"
         
-        with YoutubeDL(self._get_ytdl_options()) as ytdl:
-            file_path_collector = FilePathCollector()
-            ytdl.add_post_processor(file_path_collector)
-            result = ytdl.download([link])
+        # Sessions are shared with other downloads using the same options,
+        # transient errors are retried with backoff
+        result, file_paths, _ = call_with_retry(
+            YOUTUBE_ENDPOINT, self.pool.download, self._get_ytdl_options(), link, listener)
+        
+        if not file_paths:
+            raise ValueError(f"Download failed for video ID: {video_id}")
             
-            if not file_path_collector.file_paths:
-                raise ValueError(f"Download failed for video ID: {video_id}")
-                
-            file_path = file_path_collector.file_paths[0]
-            self._generate_metadata(file_path, link)
-            return result, file_path
+        file_path = file_paths[0]
+        self._generate_metadata(file_path, link)
+        if listener is not None:
+            listener("tagged")
+        return result, file_path
 
     def download_multiple_videos(self, video_ids: List[str]) -> List[Tuple[str, int, str]]:
         """Downloads multiple videos and returns their results."""
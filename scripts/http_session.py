@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import os
+import threading
+import requests
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (10, 30)
+DEFAULT_POOL_SIZE = min(32, (os.cpu_count() or 1) + 4)
+
+_session = None
+_pool_size = None
+_lock = threading.Lock()
+
+def create_http_session(pool_size: int):
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "HEAD"],
+        respect_retry_after_header=True
+    )
+    # Keep one connection per worker thread alive for every host
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def configure_http_session(thread_count: int = 0):
+    # Size the connection pool for the number of worker threads, 0 uses the executor default
+    global _session, _pool_size
+    pool_size = thread_count if thread_count > 0 else DEFAULT_POOL_SIZE
+    with _lock:
+        if _session is None or _pool_size < pool_size:
+            # The previous session is not closed, other threads may still be streaming
+            # responses through it. Its connections are released once it is garbage collected
+            _session = create_http_session(pool_size)
+            _pool_size = pool_size
+
+def get_http_session():
+    with _lock:
+        session = _session
+    if session is None:
+        configure_http_session()
+        with _lock:
+            session = _session
+    return session
+
+@contextmanager
+def open_url(url, timeout=DEFAULT_TIMEOUT):
+    # Streams a response and always releases its connection back to the pool
+    response = get_http_session().get(url, stream=True, timeout=timeout)
+    try:
+        response.raise_for_status()
+        yield response
+    finally:
+        response.close()
+
+def fetch_bytes(url, timeout=DEFAULT_TIMEOUT):
+    with open_url(url, timeout) as response:
+        return response.content
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Song states that count towards completion
+FINISHED_STATES = ("done", "failed", "not_found")
+
+# Number of recent events kept per job for streaming watchers
+MAX_JOB_EVENTS = 1000
+
+
+class Job:
+    """Tracks the state of a single background download job."""
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.songs = OrderedDict()
+        self.song_bytes = {}
+        self.current_song = ""
+        self.events = deque(maxlen=MAX_JOB_EVENTS)
+        self.next_event_id = 0
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+
+    def _add_event(self, event: Dict) -> None:
+        """Appends an event and wakes up streaming watchers. Requires the lock."""
+        event["id"] = self.next_event_id
+        self.next_event_id += 1
+        self.events.append(event)
+        self.changed.notify_all()
+
+    def update_song(self, song_name: str, state: str, **details) -> None:
+        """
+        Records a song's state, used as the progress callback of the pipelines.
+        "bytes" events update the download progress of a song that is downloading.
+        """
+        with self.lock:
+            if state == "bytes":
+                self.song_bytes[song_name] = details
+                state = "downloading"
+            self.songs[song_name] = state
+            if state not in FINISHED_STATES:
+                self.current_song = song_name
+            self._add_event({"type": "song", "song": song_name, "state": state, **details})
+
+    def set_status(self, status: str, error: str = None) -> None:
+        with self.lock:
+            self.status = status
+            self.error = error
+            if status == "running":
+                self.started = time.time()
+            elif status in ("completed", "error"):
+                self.finished = time.time()
+            self._add_event({"type": "job", "status": status, "error": error})
+
+    def wait_for_events(self, after_id: int, timeout: float) -> Tuple[List[Dict], bool]:
+        """
+        Blocks until events newer than after_id exist or the timeout expires.
+        Returns the new events and whether the job has finished.
+        """
+        with self.lock:
+            self.changed.wait_for(lambda: self.next_event_id > after_id + 1 or self.finished is not None, timeout)
+            events = [event for event in self.events if event["id"] > after_id]
+            return events, self.finished is not None
+
+    def to_dict(self, include_songs: bool = True) -> Dict:
+        """Returns the job progress in the format polled by the web front end."""
+        with self.lock:
+            songs = [{"name": name, "state": state, **self.song_bytes.get(name, {})}
+                     for name, state in self.songs.items()] if include_songs else None
+            completed = sum(1 for state in self.songs.values() if state in FINISHED_STATES)
+            total = len(self.songs)
+
+            throughput = 0.0
+            eta = None
+            if self.started is not None:
+                elapsed = (self.finished or time.time()) - self.started
+                if elapsed > 0 and completed:
+                    throughput = completed / elapsed * 60
+                    eta = (total - completed) / (completed / elapsed) if self.finished is None else 0
+
+            current_bytes = self.song_bytes.get(self.current_song, {}) if self.songs.get(self.current_song) == "downloading" else {}
+            return {
+                "job_id": self.id,
+                "current_task": self.kind,
+                "status": self.status,
+                "error": self.error,
+                "total_songs": total,
+                "completed_songs": completed,
+                "current_song": self.current_song if self.status == "running" else "",
+                "current_state": self.songs.get(self.current_song) if self.status == "running" else None,
+                "current_bytes": current_bytes,
+                "songs": songs,
+                "songs_per_minute": round(throughput, 2),
+                "eta_seconds": round(eta) if eta is not None else None
+            }
+
+
+class JobManager:
+    """Runs download pipelines on a bounded worker pool and keeps recent jobs for progress queries."""
+
+    def __init__(self, max_workers: int = 1, max_jobs: int = 100):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, kind: str, target: Callable[..., bool], *args, **kwargs) -> Job:
+        """
+        Queues target(*args, progress=job.update_song, **kwargs) and returns the job immediately.
+        The target returns True on success.
+        """
+        job = Job(kind)
+        with self.lock:
+            self.jobs[job.id] = job
+            # Forget the oldest finished jobs
+            while len(self.jobs) > self.max_jobs:
+                oldest_id, oldest = next(iter(self.jobs.items()))
+                if oldest.finished is None:
+                    break
+                del self.jobs[oldest_id]
+
+        self.executor.submit(self._run, job, target, args, kwargs)
+        return job
+
+    def _run(self, job: Job, target: Callable[..., bool], args, kwargs) -> None:
+        job.set_status("running")
+        try:
+            success = target(*args, progress=job.update_song, **kwargs)
+            if success:
+                job.set_status("completed")
+            else:
+                job.set_status("error", "Processing failed")
+        except Exception as e:
+            job.set_status("error", str(e))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def latest(self) -> Optional[Job]:
+        with self.lock:
+            return next(reversed(self.jobs.values()), None)
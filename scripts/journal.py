@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+import os
+import json
+import tempfile
+import threading
+import unittest
+
+# Stages of a song in the order they are reached
+RESOLVED = "resolved"
+DOWNLOADED = "downloaded"
+TRANSCODED = "transcoded"
+TAGGED = "tagged"
+PLACED = "placed"
+
+# Stage of a file moved to a temporary name while reordering
+PARKED = "parked"
+
+JOURNAL_FILE_NAME = ".sync_journal.jsonl"
+
+# Key of the entry identifying the work a journal was written for
+FINGERPRINT_KEY = "__fingerprint__"
+
+class Journal:
+    """
+    Append-only JSON lines log of stage transitions, so an interrupted run
+    can resume instead of starting over.
+
+    Every record is flushed and synced to disk before record() returns.
+    Records update the entry of their key, so replaying the journal after a
+    crash rebuilds the latest state of every key. A last record cut off by
+    the crash is ignored.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        self.file = None
+        self.needs_newline = False
+        self.lock = threading.Lock()
+        self._replay()
+
+    def _replay(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Unable to read journal '{self.path}': {e}")
+            return
+
+        for line in data.splitlines():
+            try:
+                record = json.loads(line)
+                key = record.pop("key")
+            except (ValueError, KeyError, AttributeError):
+                continue
+            self.entries[key] = {**self.entries.get(key, {}), **record}
+        # Records appended after a cut off line must start on a new line
+        self.needs_newline = bool(data) and not data.endswith("\n")
+
+    def is_empty(self):
+        with self.lock:
+            return not self.entries
+
+    def get(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def items(self):
+        with self.lock:
+            return list(self.entries.items())
+
+    def bind(self, fingerprint):
+        # Discards the journal if it was written for other work and records the fingerprint
+        # of this work. Returns True if entries of an interrupted run were kept
+        entry = self.get(FINGERPRINT_KEY)
+        if entry is not None and entry.get("fingerprint") == fingerprint:
+            return len(self.items()) > 1
+        if not self.is_empty():
+            print(f"Discarding journal '{self.path}' of a different run")
+            self.close(remove=True)
+        self.record(FINGERPRINT_KEY, "started", fingerprint=fingerprint)
+        return False
+
+    def record(self, key, stage, **data):
+        line = json.dumps({"key": key, "stage": stage, **data}, ensure_ascii=False) + "\n"
+        with self.lock:
+            self.entries[key] = {**self.entries.get(key, {}), "stage": stage, **data}
+            try:
+                if self.file is None:
+                    self.file = open(self.path, "a", encoding="utf-8")
+                    if self.needs_newline:
+                        line = "\n" + line
+                        self.needs_newline = False
+                self.file.write(line)
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            except OSError as e:
+                print(f"Unable to write journal '{self.path}': {e}")
+
+    def compact(self, keep):
+        # Rewrites the journal with the entries for which keep(key, entry) is true,
+        # removing it if there are none
+        with self.lock:
+            self._close()
+            self.entries = {key: entry for key, entry in self.entries.items() if keep(key, entry)}
+            try:
+                if not self.entries:
+                    if os.path.exists(self.path):
+                        os.remove(self.path)
+                    return
+
+                # Write to a temporary file first so a crash never leaves a partial journal
+                fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)))
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    for key, entry in self.entries.items():
+                        f.write(json.dumps({"key": key, **entry}, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                print(f"Unable to compact journal '{self.path}': {e}")
+
+    def _close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def close(self, remove=False):
+        # Removing the journal marks the run as complete
+        with self.lock:
+            self._close()
+            if remove:
+                self.entries = {}
+                self.needs_newline = False
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+
+
+class TestJournal(unittest.TestCase):
+    """Test cases for replaying and compacting journals."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "songs.json.journal")
+
+    def reopen(self, journal):
+        journal.close()
+        return Journal(self.path)
+
+    def test_replay_merges_records_of_a_key(self):
+        journal = Journal(self.path)
+        journal.record("0:Song", RESOLVED, youtube_id="abc")
+        journal.record("0:Song", PLACED, file_path="Song.wav")
+        journal = self.reopen(journal)
+        self.assertEqual(journal.get("0:Song"), {"stage": PLACED, "youtube_id": "abc", "file_path": "Song.wav"})
+        journal.close()
+
+    def test_replay_ignores_torn_last_line(self):
+        journal = Journal(self.path)
+        journal.record("0:Song", RESOLVED, youtube_id="abc")
+        journal.close()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"key": "1:Other", "stage": "res')
+
+        journal = Journal(self.path)
+        self.assertEqual(journal.items(), [("0:Song", {"stage": RESOLVED, "youtube_id": "abc"})])
+        # The next record starts on a new line, so it survives the following replay
+        journal.record("1:Other", RESOLVED, youtube_id="def")
+        journal = self.reopen(journal)
+        self.assertEqual(journal.get("1:Other"), {"stage": RESOLVED, "youtube_id": "def"})
+        self.assertEqual(len(journal.items()), 2)
+        journal.close()
+
+    def test_compact_keeps_latest_entries(self):
+        journal = Journal(self.path)
+        journal.record("0:Song", RESOLVED, youtube_id="abc")
+        journal.record("1:Other", RESOLVED, youtube_id="def")
+        journal.record("0:Song", PLACED, file_path="Song.wav")
+        journal.compact(lambda key, entry: entry["stage"] == PLACED)
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.assertEqual(len(f.read().splitlines()), 1)
+
+        # Records after compacting are appended to the rewritten journal
+        journal.record("2:Third", RESOLVED, youtube_id="ghi")
+        journal = self.reopen(journal)
+        self.assertEqual(journal.items(), [
+            ("0:Song", {"stage": PLACED, "youtube_id": "abc", "file_path": "Song.wav"}),
+            ("2:Third", {"stage": RESOLVED, "youtube_id": "ghi"}),
+        ])
+        journal.close()
+
+    def test_compact_removes_empty_journal(self):
+        journal = Journal(self.path)
+        journal.record("0:Song", RESOLVED, youtube_id="abc")
+        journal.compact(lambda key, entry: False)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertTrue(journal.is_empty())
+
+    def test_bind_discards_journal_of_other_work(self):
+        journal = Journal(self.path)
+        self.assertFalse(journal.bind("first"))
+        journal.record("0:Song", RESOLVED, youtube_id="abc")
+        journal = self.reopen(journal)
+        self.assertTrue(journal.bind("first"))
+        journal = self.reopen(journal)
+        self.assertFalse(journal.bind("second"))
+        self.assertIsNone(journal.get("0:Song"))
+        journal.close()
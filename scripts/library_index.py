@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+import os
+import sys
+import hashlib
+import sqlite3
+import argparse
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+INDEX_FILE_NAME = ".library_index.db"
+INDEX_VERSION = 1
+
+# Reads (video_id, name, track_num, metadata_tags) from a song file, None if it is not a song file
+# and raises ValueError if it is a song file in an invalid format
+SongFileReader = Callable[[str], Optional[Tuple[str, str, int, List[str]]]]
+
+class LibraryEntry(NamedTuple):
+    file_name: str
+    video_id: Optional[str]
+    name: Optional[str]
+    track_num: int
+    size: int
+    mtime: int
+    metadata_tags: List[str]
+    tag_digest: str
+    invalid: bool
+
+def get_tag_digest(video_id, name, track_num, metadata_tags):
+    data = "\0".join([str(video_id), str(name), str(track_num), ",".join(sorted(metadata_tags))])
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+def is_index_file(file_name):
+    return file_name.startswith(INDEX_FILE_NAME)
+
+class LibraryIndex:
+    """
+    Per-playlist index of song files stored next to the playlist config.
+
+    Song tags are only read again when a file's size or mtime changes, so
+    scanning an unchanged playlist only costs a directory listing and a stat
+    per file.
+    """
+
+    def __init__(self, playlist_name):
+        self.playlist_name = playlist_name
+        self.index_file = os.path.join(playlist_name, INDEX_FILE_NAME)
+        self.files_read = 0
+
+    def _connect(self):
+        connection = sqlite3.connect(self.index_file)
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != INDEX_VERSION:
+            connection.execute("DROP TABLE IF EXISTS songs")
+            connection.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS songs ("
+            "file_name TEXT PRIMARY KEY, "
+            "video_id TEXT, "
+            "name TEXT, "
+            "track_num INTEGER NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "mtime INTEGER NOT NULL, "
+            "metadata_tags TEXT NOT NULL, "
+            "tag_digest TEXT NOT NULL, "
+            "invalid INTEGER NOT NULL)"
+        )
+        return connection
+
+    def _read_entry(self, file_name, stat, read_song_file: SongFileReader):
+        self.files_read += 1
+        invalid = False
+        song = None
+        try:
+            song = read_song_file(os.path.join(self.playlist_name, file_name))
+        except ValueError:
+            invalid = True
+
+        video_id, name, track_num, metadata_tags = song if song is not None else (None, None, 0, [])
+        return LibraryEntry(file_name, video_id, name, track_num, stat.st_size, stat.st_mtime_ns,
+                            metadata_tags, get_tag_digest(video_id, name, track_num, metadata_tags), invalid)
+
+    @staticmethod
+    def _row_to_entry(row):
+        file_name, video_id, name, track_num, size, mtime, metadata_tags, tag_digest, invalid = row
+        return LibraryEntry(file_name, video_id, name, track_num, size, mtime,
+                            metadata_tags.split(",") if metadata_tags else [], tag_digest, bool(invalid))
+
+    def _scan(self, read_song_file: SongFileReader, force: bool):
+        with self._connect() as connection:
+            cached = {row[0]: self._row_to_entry(row) for row in connection.execute("SELECT * FROM songs")}
+
+            entries = []
+            for file_name in os.listdir(self.playlist_name):
+                if is_index_file(file_name):
+                    continue
+
+                file_path = os.path.join(self.playlist_name, file_name)
+                if not os.path.isfile(file_path):
+                    continue
+
+                stat = os.stat(file_path)
+                entry = cached.pop(file_name, None)
+                if force or entry is None or entry.size != stat.st_size or entry.mtime != stat.st_mtime_ns:
+                    entry = self._read_entry(file_name, stat, read_song_file)
+                    connection.execute(
+                        "INSERT OR REPLACE INTO songs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (entry.file_name, entry.video_id, entry.name, entry.track_num, entry.size, entry.mtime,
+                         ",".join(entry.metadata_tags), entry.tag_digest, int(entry.invalid))
+                    )
+                entries.append(entry)
+
+            # Drop entries for files that no longer exist
+            connection.executemany("DELETE FROM songs WHERE file_name = ?", [(file_name,) for file_name in cached])
+        connection.close()
+        return entries
+
+    def scan(self, read_song_file: SongFileReader, force: bool = False) -> List[LibraryEntry]:
+        """Returns an entry for every file in the playlist folder, reading only changed files."""
+        try:
+            return self._scan(read_song_file, force)
+        except sqlite3.DatabaseError as e:
+            print(f"Library index for '{self.playlist_name}' is corrupted and will be rebuilt: {e}")
+            self.remove()
+            return self._scan(read_song_file, True)
+
+    def rebuild(self, read_song_file: SongFileReader) -> List[LibraryEntry]:
+        """Discards the index and reads every file again."""
+        self.remove()
+        return self._scan(read_song_file, True)
+
+    def verify(self, read_song_file: SongFileReader) -> List[str]:
+        """Compares the index with the files on disk and returns a list of problems found."""
+        problems = []
+        try:
+            with self._connect() as connection:
+                cached = {row[0]: self._row_to_entry(row) for row in connection.execute("SELECT * FROM songs")}
+            connection.close()
+        except sqlite3.DatabaseError as e:
+            return [f"Index is corrupted: {e}"]
+
+        for file_name in sorted(os.listdir(self.playlist_name)):
+            file_path = os.path.join(self.playlist_name, file_name)
+            if is_index_file(file_name) or not os.path.isfile(file_path):
+                continue
+
+            entry = cached.pop(file_name, None)
+            actual = self._read_entry(file_name, os.stat(file_path), read_song_file)
+            if entry is None:
+                problems.append(f"Not indexed: '{file_name}'")
+            elif entry.size != actual.size or entry.mtime != actual.mtime:
+                problems.append(f"Changed since indexed: '{file_name}'")
+            elif entry.tag_digest != actual.tag_digest or entry.invalid != actual.invalid:
+                problems.append(f"Tags do not match index: '{file_name}'")
+
+        for file_name in sorted(cached):
+            problems.append(f"Indexed but missing: '{file_name}'")
+
+        return problems
+
+    def remove(self):
+        for file_name in os.listdir(self.playlist_name):
+            if is_index_file(file_name):
+                os.remove(os.path.join(self.playlist_name, file_name))
+
+def main():
+    from youtube_music_playlist_downloader import read_song_file
+
+    parser = argparse.ArgumentParser(description="Rebuild or verify the library index of playlist folders")
+    parser.add_argument("command", choices=["rebuild", "verify"], help="Action to perform")
+    parser.add_argument("playlists", nargs="+", help="Playlist folders")
+    args = parser.parse_args()
+
+    exit_code = 0
+    for playlist_name in args.playlists:
+        index = LibraryIndex(playlist_name)
+        if args.command == "rebuild":
+            entries = index.rebuild(read_song_file)
+            songs = [entry for entry in entries if entry.video_id is not None]
+            print(f"Rebuilt library index for '{playlist_name}' with {len(songs)} songs")
+        else:
+            problems = index.verify(read_song_file)
+            if problems:
+                exit_code = 1
+                print(f"Library index for '{playlist_name}' has {len(problems)} problems:")
+                print("\n".join(["- " + problem for problem in problems]))
+            else:
+                print(f"Library index for '{playlist_name}' is up to date")
+
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
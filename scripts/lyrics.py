@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+import os
+import re
+import json
+import time
+import codecs
+import sqlite3
+import threading
+from pathlib import Path
+from functools import lru_cache
+from http_session import open_url
+
+DEFAULT_CACHE_FILE = os.path.join(Path.home(), ".cache", "youtube_music_playlist_downloader", "lyrics.db")
+DEFAULT_TTL = 30 * 24 * 60 * 60  # 30 days
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+
+class LyricsCache:
+    """
+    Persistent SQLite cache of parsed lyrics keyed by video id and subtitle language.
+
+    Regenerating metadata, for example after a config change, reuses the parsed
+    lyrics instead of downloading and parsing the subtitles again.
+    """
+
+    def __init__(self, db_file: str = DEFAULT_CACHE_FILE, ttl: float = DEFAULT_TTL):
+        self.db_file = db_file
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def _connect(self):
+        # Connect lazily so playlists without lyrics never create the cache file
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+            self.connection = sqlite3.connect(self.db_file, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS lyrics ("
+                "video_id TEXT NOT NULL, "
+                "lang TEXT NOT NULL, "
+                "synced TEXT NOT NULL, "
+                "unsynced TEXT NOT NULL, "
+                "created REAL NOT NULL, "
+                "PRIMARY KEY (video_id, lang))"
+            )
+            self.connection.commit()
+        return self.connection
+
+    def get(self, video_id, lang):
+        # Returns (synced_lyrics, unsynced_lyrics) or None if missing or expired
+        with self.lock:
+            try:
+                row = self._connect().execute(
+                    "SELECT synced, unsynced, created FROM lyrics WHERE video_id = ? AND lang = ?", (video_id, lang)
+                ).fetchone()
+            except sqlite3.DatabaseError as e:
+                print(f"Unable to read lyrics cache: {e}")
+                row = None
+
+            if row is None or time.time() - row[2] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        synced_lyrics = [tuple(line) for line in json.loads(row[0])]
+        return synced_lyrics, json.loads(row[1])
+
+    def put(self, video_id, lang, synced_lyrics, unsynced_lyrics):
+        with self.lock:
+            try:
+                connection = self._connect()
+                connection.execute(
+                    "INSERT OR REPLACE INTO lyrics VALUES (?, ?, ?, ?, ?)",
+                    (video_id, lang, json.dumps(synced_lyrics), json.dumps(unsynced_lyrics), time.time())
+                )
+                connection.commit()
+            except sqlite3.DatabaseError as e:
+                print(f"Unable to cache lyrics: {e}")
+
+    def stats(self):
+        return f"{self.hits} hits, {self.misses} misses"
+
+@lru_cache(maxsize=None)
+def compile_lang_patterns(lyrics_langs):
+    # lyrics_langs are regular expressions matched against the full language code
+    return [re.compile(lyrics_lang) for lyrics_lang in lyrics_langs]
+
+def select_lyrics_lang(requested_langs, lyrics_langs, strict_lang_match):
+    # Returns the first requested language matching the configured languages in order of preference,
+    # falling back to the first available language unless strict_lang_match is set
+    if len(lyrics_langs) == 0:
+        lang = requested_langs[0]
+        print(f"Selecting first available language for lyrics: {lang}")
+        return lang
+
+    for pattern in compile_lang_patterns(tuple(lyrics_langs)):
+        for requested_lang in requested_langs:
+            if pattern.fullmatch(requested_lang):
+                print(f"Selected language for lyrics: {requested_lang}")
+                return requested_lang
+
+    print(f"Lyrics unavailable for selected languages. Available languages: {requested_langs}")
+    if strict_lang_match:
+        return None
+    lang = requested_langs[0]
+    print(f"Selecting first available language for lyrics: {lang}")
+    return lang
+
+class JSONStreamReader:
+    # Decodes JSON values one at a time from a stream of byte chunks
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read_more(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            if self.eof:
+                raise ValueError("Unexpected end of JSON stream")
+            self.eof = True
+            text = self.decoder.decode(b"", final=True)
+        else:
+            text = self.decoder.decode(chunk)
+        # Drop consumed text so the buffer only holds the value being decoded
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+
+    def peek(self, skip=WHITESPACE):
+        # Returns the next character that is not in skip
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in skip:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self._read_more()
+
+    def expect(self, char, skip=WHITESPACE):
+        if self.peek(skip) != char:
+            raise ValueError(f"Expected '{char}' at position {self.pos} of JSON stream")
+        self.pos += 1
+
+    def value(self, skip=WHITESPACE):
+        self.peek(skip)
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof or not isinstance(value, (int, float)):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read_more()
+
+def iter_json3_events(chunks):
+    # Yields the entries of the top level "events" array of a json3 subtitle file
+    # without holding the whole document in memory
+    reader = JSONStreamReader(chunks)
+    reader.expect("{")
+    while reader.peek(WHITESPACE + ",") != "}":
+        key = reader.value(WHITESPACE + ",")
+        reader.expect(":")
+        if key != "events":
+            reader.value()
+            continue
+
+        reader.expect("[")
+        while reader.peek(WHITESPACE + ",") != "]":
+            yield reader.value(WHITESPACE + ",")
+        reader.expect("]")
+
+def parse_json3_lyrics(events):
+    synced_lyrics = []
+    unsynced_lyrics = []
+    last_timestamp = -1
+    last_lines = []
+
+    for event in events:
+        segs = event.get("segs")
+        if segs is None:
+            # Window and style events have no text
+            continue
+        timestamp = event["tStartMs"]
+        # Remove invalid characters
+        line = "".join(seg.get("utf8", "") for seg in segs).replace("\u200b", "").replace("\u200c", "")
+
+        if (timestamp - last_timestamp) < 1000 and line.strip() in last_lines:
+            # Skip if line is repeated too quickly
+            last_timestamp = timestamp
+            continue
+
+        if timestamp == last_timestamp:
+            # Append line into previous line if same timestamp has multiple lines
+            synced_lyrics[-1] = (synced_lyrics[-1][0] + "\n" + line, synced_lyrics[-1][1])
+            unsynced_lyrics[-1] += "\n" + line
+            last_lines.append(line.strip())
+        else:
+            synced_lyrics.append((line, timestamp))
+            unsynced_lyrics.append(line)
+            last_lines = [line.strip()]
+        last_timestamp = timestamp
+
+    return synced_lyrics, unsynced_lyrics
+
+def fetch_lyrics(subtitles_url):
+    with open_url(subtitles_url) as response:
+        return parse_json3_lyrics(iter_json3_events(response.iter_content(CHUNK_SIZE)))
+
+def get_lyrics(video_id, lang, subtitles_url, cache=None):
+    # Returns (synced_lyrics, unsynced_lyrics) for a subtitle language, using the cache if given
+    cache = cache or shared_lyrics_cache
+    lyrics = cache.get(video_id, lang)
+    if lyrics is None:
+        lyrics = fetch_lyrics(subtitles_url)
+        cache.put(video_id, lang, *lyrics)
+    return lyrics
+
+shared_lyrics_cache = LyricsCache()
@@ -1,16 +1,64 @@
 #!/usr/bin/env python3
+import itertools
 import json
 import os
 import re
-from typing import List, Dict
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, List, Dict, Tuple, Optional, Union
 from download_single import YouTubeDownloader
+from journal import Journal, DOWNLOADED, PLACED
+from resilience import RetryQueue, is_transient
+
+# Output files being downloaded by any manager in this process, by normalized path,
+# with the number of downloads holding or waiting for each lock
+_output_locks: Dict[str, Tuple[threading.Lock, int]] = {}
+_output_locks_lock = threading.Lock()
+
+
+@contextmanager
+def lock_output(output_template: str):
+    """
+    Serializes downloads to the same output file, such as two web jobs downloading
+    the same song into a shared directory. Locks are dropped once unused.
+    """
+    # File systems may ignore case, so names that differ only in case share a lock
+    key = os.path.abspath(output_template).casefold()
+    with _output_locks_lock:
+        lock, users = _output_locks.get(key, (None, 0))
+        if lock is None:
+            lock = threading.Lock()
+        _output_locks[key] = (lock, users + 1)
+    try:
+        with lock:
+            yield
+    finally:
+        with _output_locks_lock:
+            lock, users = _output_locks[key]
+            if users > 1:
+                _output_locks[key] = (lock, users - 1)
+            else:
+                del _output_locks[key]
+
 
 class DownloadManager:
     """Manages the downloading of songs from YouTube."""
     
-    def __init__(self, json_file: str, download_dir: str):
+    def __init__(self, json_file: Optional[str], download_dir: str, workers: int = 1,
+                 progress: Optional[Callable[..., None]] = None, audio_codec: str = "wav",
+                 journal: Optional[Journal] = None):
         self.json_file = json_file
         self.download_dir = download_dir
+        self.workers = max(1, workers)
+        self.progress = progress
+        self.audio_codec = audio_codec
+        self.journal = journal
+        # Output names claimed by songs of this manager, so concurrent downloads of
+        # songs with the same or equivalent names never share a file
+        self._output_owners: Dict[str, Dict[str, str]] = {}
+        self._output_lock = threading.Lock()
         self.ensure_download_directory()
     
     def ensure_download_directory(self) -> None:
@@ -18,9 +66,14 @@ class DownloadManager:
         os.makedirs(self.download_dir, exist_ok=True)
     
     def load_songs(self) -> List[Dict[str, str]]:
-        """Loads songs from the JSON file."""
+        """
+        Loads songs from the JSON file. Each song gets its 'row' in the file,
+        so songs with the same name are journaled separately.
+        """
         with open(self.json_file, 'r', encoding='utf-8') as f:
             data = json.load(f)
+        for row, song in enumerate(data['songs']):
+            song['row'] = row
         return data['songs']
     
     def _sanitize_filename(self, filename: str) -> str:
@@ -47,36 +100,187 @@ class DownloadManager:
             base_name = youtube_id
         return f"{base_name}"
     
-    def _get_output_template(self, song_name: str, youtube_id: str) -> str:
+    def _get_output_template(self, song: Dict[str, str]) -> str:
         """
-        Creates the output template for yt-dlp.
+        Creates the output template for yt-dlp. A song whose file name is already
+        used by another song gets a numbered suffix, the same song always gets
+        the same name so retries reuse it.
         """
-        filename = self._get_safe_filename(song_name, youtube_id)
+        base_name = self._get_safe_filename(song['name'], song['youtube_id'])
+        filename = base_name
+        with self._output_lock:
+            for number in itertools.count(2):
+                # File systems may ignore case, so names that differ only in case collide
+                if self._output_owners.setdefault(filename.casefold(), song) is song:
+                    break
+                filename = f"{base_name} ({number})"
         return os.path.join(self.download_dir, filename)
     
-    def download_songs(self) -> None:
+    def _download(self, song: Dict[str, str], retry_queue: Optional[RetryQueue] = None) -> Tuple[int, str, str]:
+        """
+        Downloads a single song entry without printing anything.
+        Returns (result, file_path, error) where failures have a result of -1.
+        Songs that failed with transient errors are added to retry_queue, if given.
+        """
+        self._notify(song['name'], "downloading")
+        try:
+            output_template = self._get_output_template(song)
+            
+            # Create custom downloader for each song with specific output template
+            downloader = YouTubeDownloader(self.download_dir, output_template, audio_codec=self.audio_codec)
+            
+            with lock_output(output_template):
+                result, file_path = downloader.download_video(
+                    song['youtube_id'],
+                    lambda state, **details: self._on_download_event(song, state, **details)
+                )
+            if result == 0 and os.path.exists(file_path):
+                # The file is written straight into the download directory
+                self._record(song, PLACED, file_path=file_path)
+            self._notify(song['name'], "done" if result == 0 else "failed")
+            return result, file_path, ""
+        except Exception as e:
+            self._notify(song['name'], "failed")
+            if retry_queue is not None and is_transient(e):
+                retry_queue.add(song)
+                return -1, "", f"{e}, retrying at the end"
+            return -1, "", str(e)
+
+    def _on_download_event(self, song: Dict[str, str], state: str, **details) -> None:
+        """Journals the end of the download before passing the event on."""
+        if state == "transcoding":
+            self._record(song, DOWNLOADED)
+        self._notify(song['name'], state, **details)
+
+    def _journal_key(self, song: Dict[str, str]) -> str:
+        """Returns the journal key of a song, its row and name if it has a row."""
+        return f"{song['row']}:{song['name']}" if 'row' in song else song['name']
+
+    def _record(self, song: Dict[str, str], stage: str, **data) -> None:
+        """Records a song's stage in the journal, if any."""
+        if self.journal is not None:
+            self.journal.record(self._journal_key(song), stage, **data)
+
+    def _get_placed_file(self, song: Dict[str, str]) -> Optional[str]:
+        """Returns the file of a song an interrupted run already finished, if it still exists."""
+        if self.journal is None:
+            return None
+        entry = self.journal.get(self._journal_key(song))
+        if entry is None or entry['stage'] != PLACED or not os.path.exists(entry['file_path']):
+            return None
+        return entry['file_path']
+
+    def _notify(self, song_name: str, state: str, **details) -> None:
+        """Passes a song's download state to the progress callback, if any."""
+        if self.progress is not None:
+            self.progress(song_name, state, **details)
+
+    def _report(self, song: Dict[str, str], result: int, file_path: str, error: str) -> None:
+        """Prints the outcome of a song download."""
+        if error:
+            print(f"Error downloading {song['name']}: {error}")
+        elif result == 0:
+            print(f"Successfully downloaded: {song['name']}")
+            print(f"Saved as: {os.path.basename(file_path)}")
+        else:
+            print(f"Failed to download: {song['name']}")
+
+    def download_song(self, song: Dict[str, str], retry_queue: Optional[RetryQueue] = None) -> Tuple[int, str]:
+        """
+        Downloads a single song entry and returns the yt-dlp result and file path.
+        Failures are reported and returned as (-1, ""). Songs that failed with
+        transient errors are added to retry_queue, if given.
+        """
+        if not song['youtube_id']:
+            print(f"No YouTube ID found for: {song['name']}")
+            return -1, ""
+
+        file_path = self._get_placed_file(song)
+        if file_path is not None:
+            print(f"Already downloaded: {song['name']}")
+            return 0, file_path
+
+        print(f"Downloading: {song['name']}")
+        result, file_path, error = self._download(song, retry_queue)
+        self._report(song, result, file_path, error)
+        if error:
+            return -1, ""
+        return result, file_path
+
+    def download_song_list(self, songs: List[Dict[str, str]]) -> List[Tuple[str, int, str]]:
+        """
+        Downloads songs using the worker pool and returns (name, result, file_path)
+        for every song in input order. At most twice the worker count is queued
+        at once, and results are reported in input order as they become ready.
+        Songs that failed with transient errors are downloaded once more at the end.
+        """
+        retry_queue = RetryQueue()
+        results = self._download_all(songs, retry_queue)
+
+        retry_songs = retry_queue.drain()
+        if retry_songs:
+            print(f"Retrying {len(retry_songs)} downloads that failed temporarily...")
+            # Songs with the same name are separate rows, so retries are matched by song
+            retried = {id(song): outcome for song, outcome in zip(retry_songs, self._download_all(retry_songs, None))}
+            results = [retried.get(id(song), outcome) for song, outcome in zip(songs, results)]
+
+        return results
+
+    def _download_all(self, songs: List[Dict[str, str]],
+                      retry_queue: Optional[RetryQueue]) -> List[Tuple[str, int, str]]:
+        """Runs one round of downloads, queueing transient failures in retry_queue if given."""
+        results = []
+        if self.workers <= 1:
+            for song in songs:
+                result, file_path = self.download_song(song, retry_queue)
+                results.append((song['name'], result, file_path))
+            return results
+
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for song in songs:
+                file_path = self._get_placed_file(song)
+                if not song['youtube_id']:
+                    pending.append((song, None))
+                elif file_path is not None:
+                    print(f"Already downloaded: {song['name']}")
+                    pending.append((song, file_path))
+                else:
+                    print(f"Downloading: {song['name']}")
+                    # Claim the output name here so duplicates are numbered in input order
+                    self._get_output_template(song)
+                    pending.append((song, executor.submit(self._download, song, retry_queue)))
+
+                # Keep memory bounded by draining the oldest results first
+                while len(pending) > self.workers * 2:
+                    results.append(self._collect(*pending.popleft()))
+
+            while pending:
+                results.append(self._collect(*pending.popleft()))
+
+        return results
+
+    def _collect(self, song: Dict[str, str], future: Union[Future, str, None]) -> Tuple[str, int, str]:
+        """
+        Waits for a pooled download and reports its outcome. future is None for
+        songs without a YouTube ID and the file path for songs already downloaded.
+        """
+        if future is None:
+            print(f"No YouTube ID found for: {song['name']}")
+            return song['name'], -1, ""
+        if isinstance(future, str):
+            return song['name'], 0, future
+
+        result, file_path, error = future.result()
+        self._report(song, result, file_path, error)
+        if error:
+            return song['name'], -1, ""
+        return song['name'], result, file_path
+
+    def download_songs(self) -> List[Tuple[str, int, str]]:
         """Downloads all songs from the JSON file."""
         songs = self.load_songs()
-        
-        for song in songs:
-            if song['youtube_id']:
-                try:
-                    print(f"Downloading: {song['name']}")
-                    output_template = self._get_output_template(song['name'], song['youtube_id'])
-                    
-                    # Create custom downloader for each song with specific output template
-                    downloader = YouTubeDownloader(self.download_dir, output_template)
-                    
-                    result, file_path = downloader.download_video(song['youtube_id'])
-                    if result == 0:
-                        print(f"Successfully downloaded: {song['name']}")
-                        print(f"Saved as: {os.path.basename(file_path)}")
-                    else:
-                        print(f"Failed to download: {song['name']}")
-                except Exception as e:
-                    print(f"Error downloading {song['name']}: {e}")
-            else:
-                print(f"No YouTube ID found for: {song['name']}")
+        return self.download_song_list(songs)
 
 def main():
     import argparse
@@ -86,6 +290,10 @@ def main():
                         help='Input JSON file path (default: songs.json)')
     parser.add_argument('-d', '--dir', type=str, default='downloads',
                         help='Download directory (default: downloads)')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of concurrent downloads (default: 1)')
+    parser.add_argument('-c', '--codec', type=str, default='wav',
+                        help="Audio codec such as wav or flac, 'passthrough' keeps the source audio (default: wav)")
     
     args = parser.parse_args()
     
@@ -93,7 +301,7 @@ def main():
         print(f"Error: {args.file} not found!")
         return
     
-    manager = DownloadManager(args.file, args.dir)
+    manager = DownloadManager(args.file, args.dir, args.workers, audio_codec=args.codec)
     manager.download_songs()
 
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+import threading
+from queue import Queue
+from typing import Dict, Iterable, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from youtube_searcher import YouTubeSearcher
+from main import DownloadManager
+from resilience import RetryQueue, is_transient
+
+_END_OF_QUEUE = None
+
+
+class StreamingPipeline:
+    """
+    Streams songs from search to download through a bounded queue.
+
+    Search threads hand each song to the download workers as soon as its
+    YouTube ID resolves. When downloads fall behind the queue fills up and
+    searches block, so neither stage runs arbitrarily far ahead of the other.
+    Searches and downloads that failed with transient errors run once more
+    after all other songs.
+    """
+
+    def __init__(self, searcher: YouTubeSearcher, manager: DownloadManager,
+                 search_threads: int = 3, download_workers: int = 1,
+                 queue_size: Optional[int] = None):
+        self.searcher = searcher
+        self.manager = manager
+        self.search_threads = search_threads
+        self.download_workers = download_workers
+        self.queue = Queue(maxsize=queue_size or download_workers * 2)
+        self.failed_searches = []
+        self.search_retries = RetryQueue()
+        self.download_retries = RetryQueue()
+        self.lock = threading.Lock()
+
+    def _search_stage(self, song: Dict[str, str], retry: bool = True) -> None:
+        """
+        Resolves a song's YouTube ID and queues it for download. Songs whose
+        search failed with a transient error are queued for retry if retry is set.
+        """
+        if not song['youtube_id']:
+            try:
+                video_id = self.searcher.search_song(song['name'])
+            except Exception as e:
+                if retry and is_transient(e):
+                    print(f"Search for '{song['name']}' failed temporarily, retrying at the end: {e}")
+                    self.search_retries.add(song)
+                    return
+                print(f"Error searching for '{song['name']}': {e}")
+                video_id = None
+            if video_id is None:
+                with self.lock:
+                    self.failed_searches.append(song['name'])
+                return
+            song['youtube_id'] = video_id
+            print(f"Found YouTube ID for: {song['name']}")
+
+        # Blocks while the download stage is saturated
+        self.queue.put(song)
+
+    def _download_stage(self) -> None:
+        """Downloads queued songs until the end-of-queue marker is received."""
+        while True:
+            song = self.queue.get()
+            try:
+                if song is _END_OF_QUEUE:
+                    return
+                self.manager.download_song(song, self.download_retries)
+            finally:
+                self.queue.task_done()
+
+    def run(self, songs: Iterable[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Searches and downloads all songs, updating their YouTube IDs in place.
+        Songs may be a generator, each song is searched as soon as it is read.
+        Returns the songs in input order.
+        """
+        song_list = []
+        workers = [
+            threading.Thread(target=self._download_stage, daemon=True)
+            for _ in range(self.download_workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.search_threads) as executor:
+                futures = []
+                for song in songs:
+                    song_list.append(song)
+                    futures.append(executor.submit(self._search_stage, song))
+                for future in futures:
+                    future.result()
+
+                retry_songs = self.search_retries.drain()
+                if retry_songs:
+                    print(f"Retrying {len(retry_songs)} searches that failed temporarily...")
+                    for future in [executor.submit(self._search_stage, song, False) for song in retry_songs]:
+                        future.result()
+        finally:
+            for _ in workers:
+                self.queue.put(_END_OF_QUEUE)
+            for worker in workers:
+                worker.join()
+
+        retry_songs = self.download_retries.drain()
+        if retry_songs:
+            print(f"Retrying {len(retry_songs)} downloads that failed temporarily...")
+            for song in retry_songs:
+                self.manager.download_song(song)
+
+        if self.failed_searches:
+            print(f"\nFailed to find: {len(self.failed_searches)} songs")
+            for song_name in self.failed_searches:
+                print(f"- {song_name}")
+
+        return song_list
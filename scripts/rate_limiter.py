@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class TokenBucketRateLimiter:
+    """
+    Thread-safe token bucket for throttling outgoing requests.
+
+    Tokens refill at `rate` per second up to `burst`. Each request takes one
+    token; when none are left the caller is given a reserved future slot and
+    sleeps outside the lock, so waiting threads never block each other and the
+    request itself runs fully concurrently (up to `max_in_flight` at a time).
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 1, max_in_flight: Optional[int] = None):
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+
+    def _reserve(self) -> float:
+        """Takes a token and returns how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+
+            # Tokens may go negative; each waiting thread owns a distinct future slot
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        """Blocks until a request may be sent."""
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Context manager that holds an in-flight slot for the duration of a request."""
+        if self._in_flight is not None:
+            self._in_flight.acquire()
+        try:
+            self.acquire()
+            yield
+        finally:
+            if self._in_flight is not None:
+                self._in_flight.release()
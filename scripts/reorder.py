@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+import uuid
+from journal import Journal, PARKED, PLACED
+
+TEMP_PREFIX = ".reorder-"
+
+def is_temp_file(file_name):
+    return file_name.startswith(TEMP_PREFIX)
+
+def get_temp_path(file_path):
+    return os.path.join(os.path.dirname(file_path), f"{TEMP_PREFIX}{uuid.uuid4().hex}{os.path.splitext(file_path)[1]}")
+
+def is_occupied(src, dst):
+    # Case-only renames on case-insensitive file systems point at the same file
+    return os.path.exists(dst) and not os.path.samefile(src, dst)
+
+def rename_all(renames, journal=None):
+    # Renames every src to dst in {src: dst} without overwriting files that have not moved yet.
+    # Only files whose destination is the current name of another moved file are parked under a
+    # temporary name first, so a shift of the whole playlist costs one rename per file.
+    # Parked files are recorded in the journal, if given, before they are moved.
+    # Returns a list of (src, dst, error) for renames that were skipped.
+    renames = {src: dst for src, dst in renames.items() if src != dst}
+    failed = []
+
+    # Destinations taken by files that are not being moved would be overwritten
+    for src, dst in list(renames.items()):
+        if dst not in renames and is_occupied(src, dst):
+            failed.append((src, dst, FileExistsError(f"'{dst}' already exists")))
+            del renames[src]
+
+    # Phase 1: park files whose destination is still occupied by another moving file
+    parked = {}
+    for src, dst in renames.items():
+        if dst in renames:
+            temp_path = get_temp_path(src)
+            if journal is not None:
+                journal.record(temp_path, PARKED, src=src, dst=dst)
+            try:
+                os.rename(src, temp_path)
+                parked[src] = temp_path
+            except OSError as e:
+                failed.append((src, dst, e))
+
+    # Phase 2: move files with a free destination first, then the parked files
+    direct = [(src, dst) for src, dst in renames.items() if dst not in renames]
+    for src, dst in direct + [(parked[src], renames[src]) for src in renames if src in parked]:
+        try:
+            if is_occupied(src, dst):
+                # The file at the destination could not be moved away
+                raise FileExistsError(f"'{dst}' already exists")
+            os.rename(src, dst)
+            if journal is not None and is_temp_file(os.path.basename(src)):
+                journal.record(src, PLACED, path=dst)
+        except OSError as e:
+            failed.append((src, dst, e))
+
+    return failed
+
+def recover_parked(journal, directory):
+    # Moves files parked by an interrupted rename_all to their destination, or back to their source
+    # if the destination is taken. Paths are resolved in directory, as renames never leave it and the
+    # directory itself may have been renamed since. Returns a list of (temp_path, dst, error) for
+    # files that could not be moved.
+    failed = []
+    for key, entry in journal.items():
+        if entry["stage"] != PARKED:
+            continue
+        temp_path = os.path.join(directory, os.path.basename(key))
+        if not os.path.exists(temp_path):
+            # Crashed before the file was parked
+            continue
+
+        dst = os.path.join(directory, os.path.basename(entry["dst"]))
+        src = os.path.join(directory, os.path.basename(entry["src"]))
+        try:
+            target = next(path for path in (dst, src) if not os.path.exists(path))
+        except StopIteration:
+            failed.append((temp_path, dst, FileExistsError(f"'{dst}' already exists")))
+            continue
+
+        try:
+            os.rename(temp_path, target)
+            journal.record(key, PLACED, path=target)
+        except OSError as e:
+            failed.append((temp_path, target, e))
+    return failed
+
+
+class TestRenameAll(unittest.TestCase):
+    """Test cases for renaming chains and cycles of files."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def create(self, *names):
+        for name in names:
+            with open(self.path(name), "w", encoding="utf-8") as f:
+                f.write(name)
+
+    def contents(self):
+        # Maps every file in the directory to the name it was created with
+        contents = {}
+        for name in os.listdir(self.directory):
+            with open(self.path(name), "r", encoding="utf-8") as f:
+                contents[name] = f.read()
+        return contents
+
+    def test_chain(self):
+        self.create("1.mp3", "2.mp3", "3.mp3")
+        failed = rename_all({self.path("1.mp3"): self.path("2.mp3"),
+                             self.path("2.mp3"): self.path("3.mp3"),
+                             self.path("3.mp3"): self.path("4.mp3")})
+        self.assertEqual(failed, [])
+        self.assertEqual(self.contents(), {"2.mp3": "1.mp3", "3.mp3": "2.mp3", "4.mp3": "3.mp3"})
+
+    def test_cycle(self):
+        self.create("1.mp3", "2.mp3", "3.mp3")
+        failed = rename_all({self.path("1.mp3"): self.path("2.mp3"),
+                             self.path("2.mp3"): self.path("3.mp3"),
+                             self.path("3.mp3"): self.path("1.mp3")})
+        self.assertEqual(failed, [])
+        self.assertEqual(self.contents(), {"1.mp3": "3.mp3", "2.mp3": "1.mp3", "3.mp3": "2.mp3"})
+
+    def test_occupied_destination_is_skipped(self):
+        self.create("1.mp3", "2.mp3")
+        failed = rename_all({self.path("1.mp3"): self.path("2.mp3")})
+        self.assertEqual([(src, dst) for src, dst, err in failed], [(self.path("1.mp3"), self.path("2.mp3"))])
+        self.assertEqual(self.contents(), {"1.mp3": "1.mp3", "2.mp3": "2.mp3"})
+
+    def test_parked_files_are_journaled(self):
+        self.create("1.mp3", "2.mp3")
+        journal = Journal(self.path(".journal"))
+        self.addCleanup(journal.close)
+        rename_all({self.path("1.mp3"): self.path("2.mp3"),
+                    self.path("2.mp3"): self.path("1.mp3")}, journal)
+        stages = [entry["stage"] for key, entry in journal.items()]
+        self.assertEqual(stages, [PLACED, PLACED])
+        self.assertTrue(all(is_temp_file(os.path.basename(key)) for key, entry in journal.items()))
+
+    def test_recover_parked(self):
+        # A crash left 1.mp3 parked on its way to the name 2.mp3 still holds
+        self.create("2.mp3")
+        temp_path = get_temp_path(self.path("1.mp3"))
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("1.mp3")
+        journal = Journal(self.path(".journal"))
+        self.addCleanup(journal.close)
+        journal.record(temp_path, PARKED, src=self.path("1.mp3"), dst=self.path("2.mp3"))
+
+        self.assertEqual(recover_parked(journal, self.directory), [])
+        self.assertEqual(journal.get(temp_path)["stage"], PLACED)
+        contents = self.contents()
+        del contents[".journal"]
+        self.assertEqual(contents, {"1.mp3": "1.mp3", "2.mp3": "2.mp3"})
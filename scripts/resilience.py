@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+import re
+import time
+import random
+import socket
+import threading
+import requests
+from typing import Callable, Dict, List, Optional, TypeVar
+from yt_dlp.networking.exceptions import HTTPError as YoutubeDLHTTPError, TransportError
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying, 429 also opens the circuit breaker right away
+TRANSIENT_STATUSES = {408, 429, 500, 502, 503, 504}
+THROTTLED_STATUSES = {429}
+
+# yt-dlp reports most failures as messages, so errors are also classified by their text
+THROTTLED_PATTERNS = re.compile(
+    r"HTTP Error 429|Too Many Requests|confirm you.re not a bot|rate.limit",
+    re.IGNORECASE)
+TRANSIENT_PATTERNS = re.compile(
+    r"HTTP Error 5\d\d|timed out|timeout|Connection (reset|refused|aborted)|Temporary failure in name resolution|"
+    r"Remote end closed connection|IncompleteRead|Unable to download (webpage|API page)|urlopen error",
+    re.IGNORECASE)
+PERMANENT_PATTERNS = re.compile(
+    r"Video unavailable|Private video|This video is not available|This video has been removed|"
+    r"copyright|members.only|Sign in to confirm your age|HTTP Error 4(0[0-4]|10)",
+    re.IGNORECASE)
+
+DEFAULT_MAX_ATTEMPTS = 4
+
+# Endpoints with their own circuit breaker
+SEARCH_ENDPOINT = "YouTube search"
+YOUTUBE_ENDPOINT = "YouTube"
+
+
+def iter_causes(error: BaseException):
+    """Yields an error and every error it was raised from or wraps."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        # yt-dlp errors keep the original exception in exc_info or cause
+        exc_info = getattr(error, "exc_info", None)
+        wrapped = exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else None
+        error = wrapped or getattr(error, "cause", None) or error.__cause__ or error.__context__
+        if not isinstance(error, BaseException):
+            error = None
+
+
+def get_status(error: BaseException) -> Optional[int]:
+    """Returns the HTTP status of an error, if it was caused by an HTTP response."""
+    if isinstance(error, YoutubeDLHTTPError):
+        return error.status
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code
+    return None
+
+
+def is_throttled(error: BaseException) -> bool:
+    """Returns True if the server asked the client to slow down."""
+    for cause in iter_causes(error):
+        if get_status(cause) in THROTTLED_STATUSES or THROTTLED_PATTERNS.search(str(cause)):
+            return True
+    return False
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Returns True for errors that may succeed when retried later, such as
+    throttling, server errors and network failures. Errors that are not
+    recognized are treated as permanent, so they are never retried.
+    """
+    if is_throttled(error):
+        return True
+    for cause in iter_causes(error):
+        status = get_status(cause)
+        if status is not None:
+            return status in TRANSIENT_STATUSES
+        if PERMANENT_PATTERNS.search(str(cause)):
+            return False
+        if isinstance(cause, (TransportError, requests.ConnectionError, requests.Timeout,
+                              socket.timeout, ConnectionError, TimeoutError)):
+            return True
+        if TRANSIENT_PATTERNS.search(str(cause)):
+            return True
+    return False
+
+
+class Backoff:
+    """Exponential backoff with full jitter, so retrying workers do not retry in lockstep."""
+
+    def __init__(self, base: float = 1.0, cap: float = 60.0):
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt: int) -> float:
+        """Returns a random delay before retry number attempt, counting from 0."""
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Pauses every call to an endpoint after it keeps failing.
+
+    The breaker opens when the endpoint throttles a request or after
+    failure_threshold transient failures in a row. While it is open, all
+    callers wait in wait() until the cooldown has passed. Each time the
+    breaker opens again without a success in between, the cooldown doubles
+    up to max_cooldown.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown: float = 30.0, max_cooldown: float = 600.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.times_opened = 0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Blocks while the breaker is open."""
+        while True:
+            with self.lock:
+                delay = self.open_until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+
+    def record_failure(self, throttled: bool = False) -> None:
+        with self.lock:
+            self.failures += 1
+            if not throttled and self.failures < self.failure_threshold:
+                return
+            now = time.monotonic()
+            if self.open_until > now:
+                # Already open, other workers failed before it opened
+                return
+            self.open_until = now + self.cooldown
+            self.times_opened += 1
+            print(f"Pausing requests to {self.name} for {self.cooldown:.0f}s after {'throttling' if throttled else f'{self.failures} failures'}")
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self.failures = 0
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(endpoint: str) -> CircuitBreaker:
+    """Returns the circuit breaker shared by every call to an endpoint."""
+    with _breakers_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = _breakers[endpoint] = CircuitBreaker(endpoint)
+        return breaker
+
+
+def call_with_retry(endpoint: str, fn: Callable[..., T], *args,
+                    max_attempts: int = DEFAULT_MAX_ATTEMPTS, backoff: Optional[Backoff] = None, **kwargs) -> T:
+    """
+    Calls fn through the endpoint's circuit breaker, retrying transient errors
+    with jittered exponential backoff. Permanent errors and the last transient
+    error are raised to the caller.
+    """
+    breaker = get_breaker(endpoint)
+    backoff = backoff or Backoff()
+    for attempt in range(max_attempts):
+        breaker.wait()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if not is_transient(e):
+                # The endpoint answered, the request itself cannot succeed
+                breaker.record_success()
+                raise
+            breaker.record_failure(is_throttled(e))
+            if attempt == max_attempts - 1:
+                raise
+            time.sleep(backoff.delay(attempt))
+        else:
+            breaker.record_success()
+            return result
+
+
+class RetryQueue:
+    """Collects work that failed with transient errors so it can run again at the end of a run."""
+
+    def __init__(self):
+        self.items = []
+        self.lock = threading.Lock()
+
+    def add(self, item) -> None:
+        with self.lock:
+            self.items.append(item)
+
+    def drain(self) -> List:
+        """Returns the queued items in the order they were added and empties the queue."""
+        with self.lock:
+            items, self.items = self.items, []
+        return items
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.items)
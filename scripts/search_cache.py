@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+DEFAULT_CACHE_FILE = ".search_cache.db"
+DEFAULT_TTL = 30 * 24 * 60 * 60  # 30 days
+DEFAULT_MAX_ENTRIES = 50000
+
+# Cache hits are written in batches, when this many are pending or the oldest is this many seconds old
+USE_FLUSH_SIZE = 100
+USE_FLUSH_INTERVAL = 30.0
+
+
+class SearchCache:
+    """
+    Persistent SQLite cache mapping normalized search queries to YouTube video IDs.
+
+    last_used only orders evictions, so hits update it in batches instead of
+    committing on every lookup. The row count is tracked in memory and only
+    recounted when an insert may exceed max_entries. Call close() to write
+    pending hits.
+    """
+
+    def __init__(self, db_file: str = DEFAULT_CACHE_FILE, ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_file = db_file
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # Time of the last hit of each query whose last_used is not written yet
+        self.pending_uses: Dict[str, float] = {}
+        self.last_flush = time.monotonic()
+        self.connection = sqlite3.connect(db_file, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS searches ("
+            "query TEXT PRIMARY KEY, "
+            "youtube_id TEXT NOT NULL, "
+            "created REAL NOT NULL, "
+            "ttl REAL NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS searches_last_used ON searches (last_used)")
+        self.connection.commit()
+        self.count = self.connection.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Normalizes a song name so trivially different spellings share an entry."""
+        query = query.casefold()
+        query = re.sub(r"[^\w\s&'-]", " ", query)
+        return re.sub(r"\s+", " ", query).strip()
+
+    def get(self, query: str) -> Optional[str]:
+        """Returns the cached video ID for a query or None if missing or expired."""
+        key = self.normalize_query(query)
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT youtube_id, created, ttl FROM searches WHERE query = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[1] > row[2]:
+                if row is not None:
+                    deleted = self.connection.execute("DELETE FROM searches WHERE query = ?", (key,)).rowcount
+                    self.connection.commit()
+                    self.pending_uses.pop(key, None)
+                    self.count -= deleted
+                self.misses += 1
+                return None
+
+            self.pending_uses[key] = now
+            if len(self.pending_uses) >= USE_FLUSH_SIZE or time.monotonic() - self.last_flush >= USE_FLUSH_INTERVAL:
+                self._flush_uses()
+                self.connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, query: str, youtube_id: str) -> None:
+        """Stores a resolved video ID and evicts the least recently used entries if full."""
+        key = self.normalize_query(query)
+        now = time.time()
+        with self.lock:
+            exists = self.connection.execute(
+                "SELECT 1 FROM searches WHERE query = ?", (key,)
+            ).fetchone() is not None
+            self.connection.execute(
+                "INSERT OR REPLACE INTO searches (query, youtube_id, created, ttl, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, youtube_id, now, self.ttl, now)
+            )
+            self.pending_uses.pop(key, None)
+            if not exists:
+                self.count += 1
+            if self.count > self.max_entries:
+                self._evict()
+            self.connection.commit()
+
+    def _flush_uses(self) -> None:
+        """Writes the pending last_used times. Requires the lock, the caller commits."""
+        if self.pending_uses:
+            self.connection.executemany(
+                "UPDATE searches SET last_used = ? WHERE query = ?",
+                [(last_used, key) for key, last_used in self.pending_uses.items()]
+            )
+            self.pending_uses.clear()
+        self.last_flush = time.monotonic()
+
+    def _evict(self) -> None:
+        """Drops the least recently used entries above max_entries."""
+        # Other processes may share the cache file, so the tracked count is verified first
+        self._flush_uses()
+        self.count = self.connection.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+        if self.count > self.max_entries:
+            self.connection.execute(
+                "DELETE FROM searches WHERE query IN "
+                "(SELECT query FROM searches ORDER BY last_used ASC LIMIT ?)",
+                (self.count - self.max_entries,)
+            )
+            self.count = self.max_entries
+
+    def stats(self) -> str:
+        """Returns a printable summary of cache hits and misses."""
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total else 0.0
+        return f"{self.hits} hits, {self.misses} misses ({hit_rate:.0f}% hit rate)"
+
+    def close(self) -> None:
+        """Writes pending hits and closes the database."""
+        with self.lock:
+            self._flush_uses()
+            self.connection.commit()
+            self.connection.close()
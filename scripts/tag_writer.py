@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import threading
+from collections import OrderedDict
+from audio_tags import open_tags
+
+# Padding reserved whenever tags outgrow their space, so later edits fit in place
+TAG_PADDING = 64 * 1024
+
+# Idle files are committed oldest first beyond this many, pending tags hold cover art in memory
+MAX_PENDING_FILES = 256
+
+class PendingTags:
+    def __init__(self, tags):
+        self.tags = tags
+        self.users = 0
+
+class TagWriter:
+    """
+    Collects tag changes per file during a sync and saves each file once.
+
+    Tags opened through the writer are kept until committed, so metadata,
+    track number and other changes to the same file share a single save.
+    Every open() must be paired with a release() once the caller is done
+    changing the tags. Saves keep any existing padding and reserve
+    TAG_PADDING when tags grow, so later syncs do not move the audio data.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING_FILES):
+        self.max_pending = max_pending
+        self.pending = OrderedDict()
+        self.files_written = 0
+        self.bytes_rewritten = 0
+        self.lock = threading.Lock()
+
+    def open(self, file_path, create=False):
+        with self.lock:
+            pending = self.pending.get(file_path)
+            if pending is not None:
+                pending.users += 1
+                return pending.tags
+
+        tags = open_tags(file_path, create)
+        with self.lock:
+            pending = self.pending.setdefault(file_path, PendingTags(tags))
+            pending.users += 1
+            return pending.tags
+
+    def release(self, file_path):
+        with self.lock:
+            pending = self.pending.get(file_path)
+            if pending is not None:
+                pending.users -= 1
+            # Commit the oldest idle files once too many are pending
+            idle_paths = [path for path, pending in self.pending.items() if pending.users <= 0]
+            overflow = idle_paths[:max(len(self.pending) - self.max_pending, 0)]
+        for path in overflow:
+            self.commit(path)
+
+    def _padding(self, info):
+        # Keep existing padding, even if large, so the audio data does not move
+        if info.padding >= 0:
+            return info.padding
+        # Audio data following the tags has to be moved to make room
+        with self.lock:
+            self.bytes_rewritten += info.size
+        return max(TAG_PADDING, info.get_default_padding())
+
+    def commit(self, file_path):
+        with self.lock:
+            pending = self.pending.pop(file_path, None)
+        if pending is None or not pending.tags.modified:
+            return
+
+        pending.tags.save(v2_version=3, padding=self._padding)
+        pending.tags.modified = False
+        with self.lock:
+            self.files_written += 1
+
+    def commit_all(self):
+        # Returns a list of (file_path, error) for files that could not be saved
+        with self.lock:
+            file_paths = list(self.pending)
+
+        errors = []
+        for file_path in file_paths:
+            try:
+                self.commit(file_path)
+            except Exception as e:
+                errors.append((file_path, e))
+        return errors
+
+    def summary(self):
+        return f"{self.files_written} files tagged, {self.bytes_rewritten / (1024 * 1024):.1f} MiB of audio rewritten"
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+from yt_dlp.postprocessor import FFmpegExtractAudioPP
+
+# Downloads wait on the network, so the download stage can run many more workers than there are cores
+DEFAULT_DOWNLOAD_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+DEFAULT_TRANSCODE_WORKERS = os.cpu_count() or 1
+
+# Keeps the source audio stream and only remuxes it into a matching container (opus, m4a, ...)
+PASSTHROUGH_CODEC = "passthrough"
+
+
+def get_preferred_codec(audio_codec: str) -> str:
+    """Maps an audio codec option to the preferredcodec of yt-dlp's FFmpegExtractAudio."""
+    return "best" if audio_codec == PASSTHROUGH_CODEC else audio_codec
+
+
+class Stage:
+    """A named worker pool that keeps track of how many tasks are queued and running."""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.queued = 0
+        self.running = 0
+        self.lock = threading.Lock()
+
+    def _run(self, fn: Callable, args, kwargs):
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self.lock:
+            self.queued += 1
+        return self.executor.submit(self._run, fn, args, kwargs)
+
+    def depth(self) -> str:
+        with self.lock:
+            return f"{self.name}: {self.running}/{self.max_workers} running, {self.queued} queued"
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.executor.shutdown(wait=wait)
+
+
+class TranscodePipeline:
+    """
+    Download, transcode and metadata stages for a playlist.
+
+    Downloads and metadata updates are network bound and share the configured
+    thread count, while ffmpeg transcodes are CPU bound and are capped at the
+    number of cores. Songs are handed to the next stage as soon as they finish,
+    so a slow transcode never holds up a download slot.
+    """
+
+    def __init__(self, thread_count: int = 0, transcode_workers: int = 0):
+        io_workers = thread_count if thread_count > 0 else DEFAULT_DOWNLOAD_WORKERS
+        transcode_workers = transcode_workers if transcode_workers > 0 else DEFAULT_TRANSCODE_WORKERS
+        self.download = Stage("download", io_workers)
+        self.transcode = Stage("transcode", min(transcode_workers, DEFAULT_TRANSCODE_WORKERS))
+        self.metadata = Stage("metadata", io_workers)
+
+    def depths(self) -> str:
+        return " | ".join(stage.depth() for stage in (self.download, self.transcode, self.metadata))
+
+    def shutdown(self, wait: bool = True) -> None:
+        for stage in (self.download, self.transcode, self.metadata):
+            stage.shutdown(wait=wait)
+
+
+class FairStage:
+    """
+    A named worker pool shared by several owners, such as playlists.
+
+    Every owner has its own queue and idle workers take the next task from
+    each owner in turn, so an owner with thousands of queued tasks delays
+    the others by at most one task per worker.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.queues = OrderedDict()
+        self.queued = 0
+        self.running = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.threads = [threading.Thread(target=self._worker, name=f"{name}_{i}", daemon=True) for i in range(max_workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def _next_task(self):
+        # The owner at the front was served longest ago, it goes to the back after this task
+        owner, queue = next(iter(self.queues.items()))
+        task = queue.popleft()
+        if queue:
+            self.queues.move_to_end(owner)
+        else:
+            del self.queues[owner]
+        return task
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while not self.queues and not self.closed:
+                    self.condition.wait()
+                if not self.queues:
+                    return
+                future, fn, args, kwargs = self._next_task()
+                self.queued -= 1
+                self.running += 1
+
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        result = fn(*args, **kwargs)
+                    except BaseException as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(result)
+            finally:
+                with self.condition:
+                    self.running -= 1
+
+    def submit(self, owner, fn: Callable, *args, **kwargs) -> Future:
+        future = Future()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError(f"Cannot submit to {self.name} stage after shutdown")
+            self.queues.setdefault(owner, deque()).append((future, fn, args, kwargs))
+            self.queued += 1
+            self.condition.notify()
+        return future
+
+    def lane(self, owner) -> "FairLane":
+        return FairLane(self, owner)
+
+    def depth(self) -> str:
+        with self.condition:
+            return f"{self.name}: {self.running}/{self.max_workers} running, {self.queued} queued for {len(self.queues)} owners"
+
+    def shutdown(self, wait: bool = True) -> None:
+        # Queued tasks still run before the workers exit
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+
+class FairLane:
+    """The tasks of one owner in a FairStage, used in place of a Stage."""
+
+    def __init__(self, stage: FairStage, owner):
+        self.stage = stage
+        self.owner = owner
+        self.name = stage.name
+        self.max_workers = stage.max_workers
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        return self.stage.submit(self.owner, fn, *args, **kwargs)
+
+    def depth(self) -> str:
+        return self.stage.depth()
+
+    def shutdown(self, wait: bool = True) -> None:
+        # The shared stage is shut down by whoever created it
+        pass
+
+
+class SharedTranscodePipeline:
+    """
+    Download, transcode and metadata stages shared by playlists synced together.
+
+    The stages have one global budget each, sized like a TranscodePipeline,
+    and take work from every playlist in turn. lanes() returns the view of
+    the stages a single playlist submits to.
+    """
+
+    def __init__(self, thread_count: int = 0, transcode_workers: int = 0):
+        io_workers = thread_count if thread_count > 0 else DEFAULT_DOWNLOAD_WORKERS
+        transcode_workers = transcode_workers if transcode_workers > 0 else DEFAULT_TRANSCODE_WORKERS
+        self.download = FairStage("download", io_workers)
+        self.transcode = FairStage("transcode", min(transcode_workers, DEFAULT_TRANSCODE_WORKERS))
+        self.metadata = FairStage("metadata", io_workers)
+
+    def lanes(self, owner) -> "PipelineLanes":
+        return PipelineLanes(self, owner)
+
+    def depths(self) -> str:
+        return " | ".join(stage.depth() for stage in (self.download, self.transcode, self.metadata))
+
+    def shutdown(self, wait: bool = True) -> None:
+        for stage in (self.download, self.transcode, self.metadata):
+            stage.shutdown(wait=wait)
+
+
+class PipelineLanes:
+    """One owner's lanes of a SharedTranscodePipeline, used in place of a TranscodePipeline."""
+
+    def __init__(self, pipeline: SharedTranscodePipeline, owner):
+        self.pipeline = pipeline
+        self.download = pipeline.download.lane(owner)
+        self.transcode = pipeline.transcode.lane(owner)
+        self.metadata = pipeline.metadata.lane(owner)
+
+    def depths(self) -> str:
+        return self.pipeline.depths()
+
+    def shutdown(self, wait: bool = True) -> None:
+        # The shared pipeline is shut down by whoever created it
+        pass
+
+
+def transcode_audio(info_dict: dict, codec: str, quality: str) -> str:
+    # Runs the same ffmpeg extraction yt-dlp would run after downloading and returns the new file path
+    extract_audio = FFmpegExtractAudioPP(preferredcodec=get_preferred_codec(codec), preferredquality=quality)
+    files_to_delete, info_dict = extract_audio.run(info_dict)
+    for file_path in files_to_delete:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    return info_dict["filepath"]
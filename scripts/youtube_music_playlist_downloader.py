@@ -8,16 +8,29 @@ import sys
 import copy
 import json
 import time
-import requests
+import argparse
 import subprocess
 import concurrent.futures
-from PIL import Image
-from io import BytesIO
+from types import MappingProxyType
+from collections.abc import Mapping
 from pathlib import Path
 from langcodes import Language
-from yt_dlp import YoutubeDL, postprocessor
+from yt_dlp import YoutubeDL
+from ytdl_pool import shared_pool
+from library_index import LibraryIndex
+from cover_art import DEFAULT_COVER_SIZE, create_cover_image, select_thumbnail
+from cover_cache import shared_cover_cache
+from http_session import configure_http_session, fetch_bytes
+from lyrics import get_lyrics, select_lyrics_lang
+from transcoder import SharedTranscodePipeline, TranscodePipeline, get_preferred_codec, transcode_audio
+from audio_tags import open_tags, clear_tags
+from content_store import get_settings_key, sanitize_info, shared_content_store
+from reorder import rename_all, recover_parked
+from journal import Journal, JOURNAL_FILE_NAME, DOWNLOADED, TRANSCODED, TAGGED
+from tag_writer import TagWriter
+from resilience import YOUTUBE_ENDPOINT, call_with_retry, is_transient
 from urllib.parse import urlparse, parse_qs
-from mutagen.id3 import ID3, APIC, TIT2, TPE1, TRCK, TALB, TDRC, WOAR, SYLT, USLT, error
+from mutagen.id3 import APIC, TIT2, TPE1, TRCK, TALB, TDRC, WOAR, SYLT, USLT, error
 
 # ID3 info:
 # APIC: thumbnail
@@ -30,22 +43,17 @@ from mutagen.id3 import ID3, APIC, TIT2, TPE1, TRCK, TALB, TDRC, WOAR, SYLT, USL
 # SYLT: synced lyrics
 # USLT: unsynced lyrics
 
-class FilePathCollector(postprocessor.common.PostProcessor):
-    def __init__(self):
-        super(FilePathCollector, self).__init__(None)
-        self.file_paths = []
-
-    def run(self, information):
-        self.file_paths.append(information['filepath'])
-        return [], information
+# Crop and scaling applied to thumbnails for cover art, part of the cover cache key
+COVER_CROP = "16:9,square,lanczos"
 
 class SongFileInfo:
-    def __init__(self, video_id, name, file_name, file_path, track_num):
+    def __init__(self, video_id, name, file_name, file_path, track_num, metadata_tags=None):
         self.video_id = video_id
         self.name = name
         self.file_name = file_name
         self.file_path = file_path
         self.track_num = track_num
+        self.metadata_tags = metadata_tags or []
 
 def write_config(file, config: dict):
     with open(file, "w") as f:
@@ -77,44 +85,104 @@ def get_playlist_info(config: dict):
         "playlistreverse": config["reverse_playlist"]
     }
     with YoutubeDL(ytdl_opts) as ytdl:
-        info_dict = ytdl.extract_info(config["url"], download=False)
+        info_dict = call_with_retry(YOUTUBE_ENDPOINT, ytdl.extract_info, config["url"], download=False)
 
     return info_dict
 
-def convert_image_type(image, image_type):
-    with BytesIO() as f:
-        image.convert("RGB").save(f, format=image_type)
-        return f.getvalue()
+def get_cover_image(info_dict, config: dict):
+    # Download the smallest thumbnail that still fills the configured cover size,
+    # or the largest one if no cover size is set
+    cover_size = config["cover_size"]
+    thumbnail = select_thumbnail(info_dict, cover_size)
 
-def update_track_num(file_path, track_num):
-    tags = ID3(file_path)
-    tags.add(TRCK(encoding=3, text=str(track_num)))
-    tags.save(v2_version=3)
+    # Finished covers are cached by thumbnail URL, crop, size and format
+    image_format = config["image_format"]
+    crop = f"{COVER_CROP},{cover_size}"
+    return shared_cover_cache.get_or_create(thumbnail, crop, image_format,
+                                            lambda: create_cover_image(fetch_bytes(thumbnail), image_format, cover_size))
 
-def update_file_order(playlist_name, song_file_info, track_num, config: dict, missing_video: bool):
-    # Fix name if mismatching
+def get_ordered_file_name(song_file_info, track_num, config: dict):
     if config["track_num_in_name"]:
         song_file_name = re.sub(r"^[0-9]+. ", "", song_file_info.file_name)
-        file_name = f"{track_num}. {song_file_name}"
-    else:
-        file_name = song_file_info.file_name
-    file_path = os.path.join(playlist_name, file_name)
-            
-    # Update song index if not matched
-    if song_file_info.track_num != track_num and config["include_metadata"]["track"]:
-        if missing_video:
-            print(f"Reordering '{song_file_info.name}' from position {song_file_info.track_num} to {track_num} due to missing video link...")
-        else:
-            print(f"Reordering '{song_file_info.name}' from position {song_file_info.track_num} to {track_num}...")
-        update_track_num(song_file_info.file_path, track_num)
+        return f"{track_num}. {song_file_name}"
+    return song_file_info.file_name
+
+def needs_reorder(song_file_info, track_num, config: dict):
+    track_mismatch = song_file_info.track_num != track_num and config["include_metadata"]["track"]
+    return track_mismatch or song_file_info.file_name != get_ordered_file_name(song_file_info, track_num, config)
+
+def get_song_positions(playlist_entries, song_file_infos, failed_track_nums):
+    # Final track num of every song by video id, songs that failed to download are skipped
+    # and songs that are missing (deleted/privated/etc.) are moved to end of the list
+    positions = {}
+    skipped_videos = 0
+    for i, video_info in enumerate(playlist_entries):
+        if video_info is None:
+            # Dummy spacer entry to retain index order
+            continue
+        if i + 1 in failed_track_nums:
+            skipped_videos += 1
+            continue
+        positions[video_info["id"]] = (i + 1 - skipped_videos, False)
+
+    playlist_video_ids = {video_info["id"] for video_info in playlist_entries if video_info is not None}
+    track_num = len(playlist_entries) - skipped_videos + 1
+    for video_id in song_file_infos.keys():
+        if video_id not in playlist_video_ids:
+            positions[video_id] = (track_num, True)
+            track_num += 1
 
-    if song_file_info.file_path != file_path:
-        if song_file_info.track_num == track_num:
-            # Track num in name was incorrectly modified manually by user
-            print(f"Renaming incorrect file name from '{song_file_info.file_name}' to '{file_name}'")
-        os.rename(song_file_info.file_path, file_path)
+    return positions
 
-    return file_path
+def reorder_playlist(playlist_name, positions, configs, tag_writer, journal=None):
+    # Update track nums first, then rename every file in one batch so renames never collide
+    try:
+        song_file_infos = get_song_file_infos(playlist_name) # May raise exception for duplicate songs
+    except:
+        # Pending metadata updates are still saved
+        tag_writer.commit_all()
+        raise
+    renames = {}
+    for video_id, (track_num, missing_video) in positions.items():
+        song_file_info = song_file_infos.get(video_id)
+        if song_file_info is None:
+            continue
+        config = configs.get(video_id)
+
+        # Update song index if not matched, joining any tag changes still pending for the file
+        if song_file_info.track_num != track_num and config["include_metadata"]["track"]:
+            tags = tag_writer.open(song_file_info.file_path)
+            if str(tags.get("TRCK")) != str(track_num):
+                if missing_video:
+                    print(f"Reordering '{song_file_info.name}' from position {song_file_info.track_num} to {track_num} due to missing video link...")
+                else:
+                    print(f"Reordering '{song_file_info.name}' from position {song_file_info.track_num} to {track_num}...")
+                tags.add(TRCK(encoding=3, text=str(track_num)))
+            tag_writer.release(song_file_info.file_path)
+
+        # Fix name if mismatching
+        file_path = os.path.join(playlist_name, get_ordered_file_name(song_file_info, track_num, config))
+        if song_file_info.file_path != file_path:
+            if song_file_info.track_num == track_num:
+                # Track num in name was incorrectly modified manually by user
+                print(f"Renaming incorrect file name from '{song_file_info.file_name}' to '{os.path.basename(file_path)}'")
+            renames[song_file_info.file_path] = file_path
+
+    # Save every file once before renaming
+    for file_path, err in tag_writer.commit_all():
+        print(f"Unable to save metadata for '{file_path}': {err}")
+    print(f"Tag writes: {tag_writer.summary()}")
+
+    # Returns the file path of every song after renaming
+    file_paths = {video_id: song_file_info.file_path for video_id, song_file_info in song_file_infos.items()}
+    failed_renames = set()
+    for src, dst, err in rename_all(renames, journal):
+        print(f"Unable to rename '{src}' to '{dst}': {err}")
+        failed_renames.add(src)
+    for video_id, file_path in file_paths.items():
+        if file_path in renames and file_path not in failed_renames:
+            file_paths[video_id] = renames[file_path]
+    return file_paths
 
 def get_metadata_map():
     return {
@@ -143,16 +211,16 @@ def valid_metadata(config: dict, metadata_dict: dict):
     selected_tags = flatten([value for key, value in get_metadata_map().items() if include_metadata[key]])
     return all([value for tag, value in metadata_dict.items() if tag in selected_tags])
 
-def get_song_info_ytdl(track_num, config: dict):
-    # Get ytdl for song info
+def get_name_format(track_num, config):
     name_format = config["name_format"]
     if config["track_num_in_name"]:
         name_format = f"{track_num}. {name_format}"
+    return name_format
 
-    ytdl_opts = {
+def build_song_info_ytdl_opts(config):
+    return {
         "quiet": True,
         "geo_bypass": True,
-        "outtmpl": name_format,
         "format": config["audio_format"],
         "cookiefile": None if config["cookie_file"] == "" else config["cookie_file"],
         "cookiesfrombrowser": None if config["cookies_from_browser"] == "" else tuple(config["cookies_from_browser"].split(":")),
@@ -160,33 +228,68 @@ def get_song_info_ytdl(track_num, config: dict):
         "allsubtitles": True,
         "postprocessors": [{
             "key": "FFmpegExtractAudio",
-            "preferredcodec": config["audio_codec"],
+            "preferredcodec": get_preferred_codec(config["audio_codec"]),
             "preferredquality": config["audio_quality"],
         }]
     }
 
-    info_dict = {}
-    return YoutubeDL(ytdl_opts)
+def build_download_ytdl_opts(config, transcode):
+    ytdl_opts = {
+        "ignoreerrors": True,
+        "format": config["audio_format"],
+        "cookiefile": None if config["cookie_file"] == "" else config["cookie_file"],
+        "cookiesfrombrowser": None if config["cookies_from_browser"] == "" else tuple(config["cookies_from_browser"].split(":")),
+        "postprocessors": [{
+            "key": "FFmpegExtractAudio",
+            "preferredcodec": get_preferred_codec(config["audio_codec"]),
+            "preferredquality": config["audio_quality"],
+        }] if transcode else [],
+        "geo_bypass": True
+    }
+
+    if not config["verbose"]:
+        ytdl_opts["quiet"] = True
+        ytdl_opts["external_downloader_args"] = ["-loglevel", "panic"]
+    return ytdl_opts
+
+def get_song_info_ytdl(track_num, config):
+    # Reuse this thread's YoutubeDL instance for the same options
+    return shared_pool.get({**config.song_info_ytdl_opts, "outtmpl": get_name_format(track_num, config)})
 
 def get_song_info(track_num, link, config: dict):
     # Get song metadata from youtube
     ytdl = get_song_info_ytdl(track_num, config)
-    return ytdl.extract_info(link, download=False)
+    return call_with_retry(YOUTUBE_ENDPOINT, ytdl.extract_info, link, download=False)
+
+def get_audio_ext(file_path):
+    # Passthrough downloads keep the source extension, so the file name is based on the actual file
+    return os.path.splitext(file_path)[1][1:]
 
 def get_subtitles_url(subtitles, lang):
     return next(sub for sub in subtitles[lang] if sub["ext"] == "json3")["url"]
 
-def generate_metadata(file_path, link, track_num, playlist_name, config: dict, regenerate_metadata: bool, force_update: bool):
+def generate_metadata(file_path, link, track_num, playlist_name, config: dict, regenerate_metadata: bool, force_update: bool, info_dict=None, tag_writer=None):
+    # Tag changes are saved by the sync's tag writer, or right away without one
+    writer = tag_writer or TagWriter()
     try:
-        tags = ID3(file_path)
+        return update_metadata(file_path, link, track_num, playlist_name, config, regenerate_metadata, force_update, info_dict, writer)
+    finally:
+        writer.release(file_path)
+        if tag_writer is None:
+            writer.commit(file_path)
+
+def update_metadata(file_path, link, track_num, playlist_name, config: dict, regenerate_metadata: bool, force_update: bool, info_dict, tag_writer):
+    try:
+        tags = tag_writer.open(file_path, create=True)
     except:
         # Unsupported audio codec for metadata
         force_update_file_name = ""
         if force_update:
             try:
-                info_dict = get_song_info(track_num, link, config)
+                if info_dict is None:
+                    info_dict = get_song_info(track_num, link, config)
                 info_dict_with_audio_ext = dict(info_dict)
-                info_dict_with_audio_ext["ext"] = config["audio_codec"]
+                info_dict_with_audio_ext["ext"] = get_audio_ext(file_path)
                 force_update_file_name = get_song_info_ytdl(track_num, config).prepare_filename(info_dict_with_audio_ext)
             except Exception as e:
                 raise Exception(f"Failed to get information for updated file name - {e}")
@@ -205,14 +308,15 @@ def generate_metadata(file_path, link, track_num, playlist_name, config: dict, r
 
     if regenerate_metadata or force_update or not valid_metadata(config, metadata_dict):
         try:
-            info_dict = get_song_info(track_num, link, config)
+            # Only extract info again if it was not captured during download
+            if info_dict is None:
+                info_dict = get_song_info(track_num, link, config)
 
             if force_update:
                 info_dict_with_audio_ext = dict(info_dict)
-                info_dict_with_audio_ext["ext"] = config["audio_codec"]
+                info_dict_with_audio_ext["ext"] = get_audio_ext(file_path)
                 force_update_file_name = get_song_info_ytdl(track_num, config).prepare_filename(info_dict_with_audio_ext)
 
-            thumbnail = info_dict.get("thumbnail")
             upload_date = info_dict.get("upload_date")
             title = info_dict.get("title")
             track = info_dict.get("track")
@@ -221,6 +325,9 @@ def generate_metadata(file_path, link, track_num, playlist_name, config: dict, r
             album = info_dict.get("album")
             subtitles = info_dict.get("subtitles")
             requested_subtitles = info_dict.get("requested_subtitles")
+            if requested_subtitles is None and subtitles:
+                # Downloads do not request subtitles, all subtitles are requested when extracting info
+                requested_subtitles = subtitles
         except Exception as e:
             raise Exception(f"Failed to get information - {e}")
 
@@ -231,40 +338,12 @@ def generate_metadata(file_path, link, track_num, playlist_name, config: dict, r
 
             # These tags will not be regenerated in case of config changes
             if not metadata_dict["APIC:Front cover"] and include_metadata["cover"]:
-                # Generate thumbnail
-                img = Image.open(requests.get(thumbnail, stream=True).raw)
-
-                # Ensure aspect ratio
-                target_ratio = [16, 9]
-                width, height = img.size
-                width_ratio = width / target_ratio[0]
-                height_ratio = height / target_ratio[1]
-                if width_ratio > height_ratio:
-                    half_width = width / 2
-                    min_offset = (height_ratio * target_ratio[0]) / 2
-                    left = half_width - min_offset
-                    right = half_width + min_offset
-                    img = img.crop([left, 0, right, height])
-                elif height_ratio > width_ratio:
-                    half_height = height / 2
-                    min_offset = (width_ratio * target_ratio[1]) / 2
-                    top = half_height - min_offset
-                    bottom = half_height + min_offset
-                    img = img.crop([0, top, width, bottom])
-
-                # Crop to square
-                width, height = img.size
-                half_width = width / 2
-                half_height = height / 2
-                min_offset = min(half_width, half_height)
-                left = half_width - min_offset
-                right = half_width + min_offset
-                top = half_height - min_offset
-                bottom = half_height + min_offset
-                img_data = convert_image_type(img.crop([left, top, right, bottom]), config["image_format"])
+                # Generate thumbnail, reusing covers created for any playlist
+                img_data = get_cover_image(info_dict, config)
                 tags.add(APIC(3, f"image/{config['image_format']}", 3, "Front cover", img_data))
 
-            if not metadata_dict["TRCK"] and include_metadata["track"]:
+            # Track num is kept in sync here so reordering does not need another save
+            if include_metadata["track"] and (not metadata_dict["TRCK"] or str(metadata_dict["TRCK"][0]) != str(track_num)):
                 tags.add(TRCK(encoding=3, text=str(track_num)))
 
             if not metadata_dict["TDRC"] and include_metadata["date"]:
@@ -287,68 +366,17 @@ def generate_metadata(file_path, link, track_num, playlist_name, config: dict, r
                 if subtitles and requested_subtitles and len(subtitles) > 0:
                     subtitles_url = None
                     try:
-                        if len(lyrics_langs) == 0:
-                            lang = next(iter(requested_subtitles))
-                            subtitles_url = get_subtitles_url(subtitles, lang)
-                            print(f"Selecting first available language for lyrics: {lang}")
-                        else:
-                            lyrics_found = False
-                            for lyrics_lang in lyrics_langs:
-                                for requested_lang in requested_subtitles.keys():
-                                    # Regex match full string
-                                    if re.match(r"^" + lyrics_lang + r"$", requested_lang):
-                                        subtitles_url = get_subtitles_url(subtitles, requested_lang)
-                                        lang = requested_lang
-                                        print(f"Selected language for lyrics: {lang}")
-                                        lyrics_found = True
-                                        break
-                                if lyrics_found:
-                                    break
-
-                            if subtitles_url is None:
-                                available_languages_str = str(list(requested_subtitles.keys()))
-                                print(f"Lyrics unavailable for selected languages. Available languages: {available_languages_str}")
-                                if not strict_lang_match:
-                                    lang = next(iter(requested_subtitles))
-                                    subtitles_url = get_subtitles_url(subtitles, lang)
-                                    print(f"Selecting first available language for lyrics: {lang}")
+                        selected_lang = select_lyrics_lang(list(requested_subtitles.keys()), lyrics_langs, strict_lang_match)
+                        if selected_lang is not None:
+                            subtitles_url = get_subtitles_url(subtitles, selected_lang)
+                            lang = selected_lang
                     except:
                         subtitles_url = None
 
                     if subtitles_url is not None:
                         try:
-                            content = json.loads(requests.get(subtitles_url, stream=True).text)
-
-                            last_timestamp = -1
-                            last_lines = []
-
-                            for event in content["events"]:
-                                timestamp = event["tStartMs"]
-                                line = ""
-                                for seg in event["segs"]:
-                                    line += seg["utf8"]
-                                # Remove invalid characters
-                                line = line.replace("\u200b", "").replace("\u200c", "")
-
-                                if (timestamp - last_timestamp) < 1000 and line.strip() in last_lines:
-                                    # Skip if line is repeated too quickly
-                                    last_timestamp = timestamp
-                                    continue
-
-                                if timestamp == last_timestamp:
-                                    # Append line into previous line if same timestamp has multiple lines
-                                    lyrics_line = list(synced_lyrics[-1])
-                                    lyrics_line[0] += "\n" + line
-                                    synced_lyrics[-1] = tuple(lyrics_line)
-
-                                    unsynced_lyrics[-1] += "\n" + line
-
-                                    last_lines.append(line.strip())
-                                else:
-                                    synced_lyrics.append((line, timestamp))
-                                    unsynced_lyrics.append(line)
-                                    last_lines = [line.strip()]
-                                last_timestamp = timestamp
+                            # Parsed lyrics are cached per video and language
+                            synced_lyrics, unsynced_lyrics = get_lyrics(info_dict["id"], lang, subtitles_url)
                         except Exception as e:
                             print(f"Unable to get lyrics: {e}")
 
@@ -386,73 +414,239 @@ def generate_metadata(file_path, link, track_num, playlist_name, config: dict, r
                     tags.add(TALB(encoding=3, text=album))
                 else:
                     tags.add(TALB(encoding=3, text="Unknown Album"))
-
-            tags.save(v2_version=3)
         except Exception as e:
             raise Exception(f"Unable to update song metadata: {e}")
 
     return force_update_file_name
 
-def download_song(link, playlist_name, track_num, config: dict):
+def download_song(link, playlist_name, track_num, config, transcode=True):
     directory = os.path.join(os.getcwd(), playlist_name)
-    name_format = config["name_format"]
-    if config["track_num_in_name"]:
-        name_format = f"{track_num}. {name_format}"
+    ytdl_opts = config.download_ytdl_opts if transcode else config.download_raw_ytdl_opts
+    ytdl_opts = {**ytdl_opts, "outtmpl": f"{directory}/{get_name_format(track_num, config)}"}
+
+    # Transient errors such as throttling are retried with backoff
+    result, file_paths, info_dicts = call_with_retry(YOUTUBE_ENDPOINT, shared_pool.download, ytdl_opts, link)
+    if len(file_paths) == 0:
+        raise Exception("No file download path found, video may be unavailable")
+    file_path = file_paths[0]
+
+    # Info gathered during download is reused to generate metadata
+    return result, file_path, info_dicts[0]
+
+def find_stored_song(video_id, settings):
+    # Returns (source_path, info_dict) of the song in another playlist, dropping sources
+    # that were renamed, removed or replaced since they were added
+    source_paths, info_dict = shared_content_store.find(video_id, settings)
+    for source_path in source_paths:
+        try:
+            song = read_song_file(source_path)
+        except ValueError:
+            song = None
+        if song is not None and song[0] == video_id:
+            return source_path, info_dict
+        shared_content_store.remove(video_id, settings, source_path)
+    return None, None
+
+def copy_stored_song(link, video_id, playlist_name, track_num, config):
+    # Copies the audio of a song already downloaded into another playlist, waiting for a download
+    # of the same song in progress first. Returns (file_path, info_dict), or None if the song has
+    # to be downloaded, in which case the caller holds the claim on it until release_song()
+    settings = get_settings_key(config)
+    while True:
+        waiting = shared_content_store.claim(video_id, settings)
+        if waiting is None:
+            break
+        waiting.result()
 
-    ytdl_opts = {
-        "outtmpl": f"{directory}/{name_format}",
-        "ignoreerrors": True,
-        "format": config["audio_format"],
-        "cookiefile": None if config["cookie_file"] == "" else config["cookie_file"],
-        "cookiesfrombrowser": None if config["cookies_from_browser"] == "" else tuple(config["cookies_from_browser"].split(":")),
-        "postprocessors": [{
-            "key": "FFmpegExtractAudio",
-            "preferredcodec": config["audio_codec"],
-            "preferredquality": config["audio_quality"],
-        }],
-        "geo_bypass": True
-    }
+    while True:
+        source_path, info_dict = find_stored_song(video_id, settings)
+        if source_path is None:
+            return None
 
-    if not config["verbose"]:
-        ytdl_opts["quiet"] = True
-        ytdl_opts["external_downloader_args"] = ["-loglevel", "panic"]
+        temp_path = None
+        try:
+            if info_dict is None:
+                # Song was indexed from an existing library file
+                info_dict = get_song_info(track_num, link, config)
+            ext = get_audio_ext(source_path)
+            file_name = get_song_info_ytdl(track_num, config).prepare_filename({**info_dict, "ext": ext})
+            file_path = os.path.join(os.getcwd(), playlist_name, file_name)
+
+            # Tags of the other playlist are removed before the file gets its own name
+            temp_path = os.path.join(os.getcwd(), playlist_name, f".{video_id}.copy.{ext}")
+            method = shared_content_store.clone(source_path, temp_path)
+            clear_tags(temp_path)
+            os.replace(temp_path, file_path)
+        except Exception as e:
+            print(f"Unable to copy '{link}' from '{source_path}': {e}")
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+            shared_content_store.remove(video_id, settings, source_path)
+            continue
 
-    with YoutubeDL(ytdl_opts) as ytdl:
-        file_path_collector = FilePathCollector()
-        ytdl.add_post_processor(file_path_collector)
-        result = ytdl.download([link])
-        if len(file_path_collector.file_paths) == 0:
-            raise Exception("No file download path found, video may be unavailable")
-        file_path = file_path_collector.file_paths[0]
+        print(f"Copied '{link}' from '{source_path}' ({method})")
+        shared_content_store.release(video_id, settings)
+        return file_path, info_dict
+
+def release_song(video_id, config):
+    # Wakes up syncs of other playlists waiting for this song
+    shared_content_store.release(video_id, get_settings_key(config))
+
+def fetch_song(link, video_id, playlist_name, track_num, config, transcode=True):
+    # Returns (result, file_path, info_dict, claimed), copying the song from another playlist when possible.
+    # claimed is set if the song was downloaded and release_song() has to be called once it is tagged
+    if not config["share_downloads"]:
+        return (*download_song(link, playlist_name, track_num, config, transcode), False)
 
-    return result, file_path
+    stored = copy_stored_song(link, video_id, playlist_name, track_num, config)
+    if stored is not None:
+        return (0, *stored, False)
+    try:
+        return (*download_song(link, playlist_name, track_num, config, transcode), True)
+    except:
+        release_song(video_id, config)
+        raise
+
+def tag_new_song(file_path, link, video_id, track_num, playlist_title, config, info_dict, downloaded, journal=None):
+    generate_metadata(file_path, link, track_num, playlist_title, config, False, False, info_dict)
+    record_song(journal, video_id, TAGGED, path=file_path)
+    if config["share_downloads"]:
+        # Later playlists with this song copy it instead of downloading it again
+        shared_content_store.add(video_id, get_settings_key(config), file_path, info_dict if downloaded else None)
+
+def record_song(journal, video_id, stage, **data):
+    if journal is not None:
+        journal.record(video_id, stage, **data)
+
+def get_partial_song(journal, video_id, playlist_name):
+    # Returns (stage, file_path, info_dict) of a song an interrupted sync downloaded but did not tag, or None
+    entry = journal.get(video_id) if journal is not None else None
+    if entry is None or entry["stage"] not in (DOWNLOADED, TRANSCODED):
+        return None
+    # The playlist folder may have been renamed since
+    file_path = os.path.join(os.getcwd(), playlist_name, os.path.basename(entry["path"]))
+    if not os.path.exists(file_path):
+        return None
+    return entry["stage"], file_path, {**entry["info"], "filepath": file_path}
 
-def download_song_and_update(video_info, playlist, link, playlist_name, track_num, config: dict):
+def download_song_and_update(video_info, playlist, link, playlist_name, track_num, config: dict, journal=None):
+    # Returns (error_message, track_num, retryable) where retryable is set for transient errors
     file_path = None
+    claimed = False
     try:
-        result, file_path = download_song(link, playlist_name, track_num, config)
+        partial_song = get_partial_song(journal, video_info["id"], playlist_name)
+        if partial_song is not None:
+            stage, file_path, info_dict = partial_song
+            print(f"Resuming '{link}' from {stage} file")
+            if stage == DOWNLOADED:
+                file_path = transcode_audio(info_dict, config["audio_codec"], config["audio_quality"])
+                record_song(journal, video_info["id"], TRANSCODED, path=file_path)
+        else:
+            result, file_path, info_dict, claimed = fetch_song(link, video_info["id"], playlist_name, track_num, config)
 
-        # Check download failed and video is unavailable
-        if result != 0 and video_info["channel_id"] is None:
-            # Video title indicates availability of video such as '[Private Video]'
-            raise Exception(f"Video is unavailable - {video_info['title']}")
+            # Check download failed and video is unavailable
+            if result != 0 and video_info["channel_id"] is None:
+                # Video title indicates availability of video such as '[Private Video]'
+                raise Exception(f"Video is unavailable - {video_info['title']}")
+            record_song(journal, video_info["id"], TRANSCODED, path=file_path, info=sanitize_info(info_dict))
 
-        generate_metadata(file_path, link, track_num, playlist["title"], config, False, False)
+        tag_new_song(file_path, link, video_info["id"], track_num, playlist["title"], config, info_dict, claimed or partial_song is not None, journal)
     except Exception as e:
         error_message = f"Unable to download video number {track_num} '{link}': {e}"
-        return error_message, track_num
-    return None, track_num
+        return error_message, track_num, is_transient(e)
+    finally:
+        if claimed:
+            release_song(video_info["id"], config)
+    return None, track_num, False
+
+def submit_song_download(pipeline, video_info, playlist, link, playlist_name, track_num, config: dict, journal=None):
+    # Each stage hands the song to the next one as soon as it finishes,
+    # the returned future resolves with the same result as download_song_and_update
+    result = concurrent.futures.Future()
+    video_id = video_info["id"]
+    claimed = False
+
+    def finish(error_message, retryable=False):
+        # A failure after the result was set, such as in release_song, must not set it again
+        if result.done():
+            return
+        try:
+            if claimed:
+                release_song(video_id, config)
+        finally:
+            result.set_result((error_message, track_num, retryable))
+
+    def fail(e):
+        finish(f"Unable to download video number {track_num} '{link}': {e}", is_transient(e))
+
+    # Exceptions raised by done callbacks are only logged by the futures, so every
+    # callback reports its errors through fail() or the result would never resolve
+    def downloaded(future):
+        nonlocal claimed
+        try:
+            download_result, file_path, info_dict, claimed = future.result()
+            if download_result != 0 and video_info["channel_id"] is None:
+                # Video title indicates availability of video such as '[Private Video]'
+                raise Exception(f"Video is unavailable - {video_info['title']}")
+            if not claimed and config["share_downloads"]:
+                # Copied from another playlist in its final format
+                record_song(journal, video_id, TRANSCODED, path=file_path, info=sanitize_info(info_dict))
+                pipeline.metadata.submit(tag_new_song, file_path, link, video_id, track_num, playlist["title"], config, info_dict, False, journal).add_done_callback(tagged)
+                return
+            record_song(journal, video_id, DOWNLOADED, path=file_path, info=sanitize_info(info_dict))
+            print(f"Downloaded '{link}' [{pipeline.depths()}]")
+            submit_transcode(info_dict)
+        except Exception as e:
+            fail(e)
 
-def update_song(video_info, song_file_info, file_path, link, track_num, playlist_name, config: dict, regenerate_metadata: bool, force_update: bool):
+    def submit_transcode(info_dict):
+        pipeline.transcode.submit(transcode_audio, info_dict, config["audio_codec"], config["audio_quality"]).add_done_callback(
+            lambda future: transcoded(future, info_dict))
+
+    def transcoded(future, info_dict):
+        try:
+            file_path = future.result()
+            record_song(journal, video_id, TRANSCODED, path=file_path)
+            submit_tagging(file_path, info_dict)
+        except Exception as e:
+            fail(e)
+
+    def submit_tagging(file_path, info_dict):
+        pipeline.metadata.submit(tag_new_song, file_path, link, video_id, track_num, playlist["title"], config, info_dict, True, journal).add_done_callback(tagged)
+
+    def tagged(future):
+        try:
+            future.result()
+            finish(None)
+        except Exception as e:
+            fail(e)
+
+    # Songs an interrupted sync already downloaded continue from the stage they reached
+    partial_song = get_partial_song(journal, video_id, playlist_name)
+    if partial_song is not None:
+        stage, file_path, info_dict = partial_song
+        print(f"Resuming '{link}' from {stage} file")
+        if stage == DOWNLOADED:
+            submit_transcode(info_dict)
+        else:
+            submit_tagging(file_path, info_dict)
+        return result
+
+    pipeline.download.submit(fetch_song, link, video_id, playlist_name, track_num, config, False).add_done_callback(downloaded)
+    return result
+
+def update_song(video_info, song_file_info, file_path, link, track_num, playlist_name, config: dict, regenerate_metadata: bool, force_update: bool, tag_writer=None):
     # Generate metadata just in case it is missing
     video_unavailable = False
     error_message = []
     try:
-        force_update_file_name = generate_metadata(file_path, link, track_num, playlist_name, config, regenerate_metadata, force_update)
+        force_update_file_name = generate_metadata(file_path, link, track_num, playlist_name, config, regenerate_metadata, force_update, None, tag_writer)
         if force_update:
             force_update_file_path = os.path.join(playlist_name, force_update_file_name)
             if file_path != force_update_file_path:
-                # Track name needs updating to proper format
+                # Track name needs updating to proper format, pending tags are saved under the old name first
+                if tag_writer is not None:
+                    tag_writer.commit(file_path)
                 print(f"Renaming incorrect file name from '{Path(file_path).stem}' to '{Path(force_update_file_path).stem}'")
                 os.rename(file_path, force_update_file_path)
     except Exception as e:
@@ -488,32 +682,37 @@ def get_video_id_from_metadata(tags):
 
     return get_url_parameter(str(links[0]), "v")
 
-def get_song_file_info(playlist_name, song_file_name):
-    song_file_path = os.path.join(playlist_name, song_file_name)
-
+def read_song_file(song_file_path):
     try:
-        tags = ID3(song_file_path)
+        tags = open_tags(song_file_path)
     except:
         # File is not considered a song file if it contains no metadata
         return None
 
     try:
         song_video_id = get_video_id_from_metadata(tags)
-        song_name = tags.get("TIT2", song_file_name)
+        song_name = str(tags.get("TIT2", os.path.basename(song_file_path)))
         song_track_num = int(str(tags.get("TRCK", 0)))
     except Exception as e:
-        print(f"Song file '{song_file_name}' is in an invalid format and will be ignored")
-        return None
+        raise ValueError(f"Song file '{song_file_path}' is in an invalid format") from e
 
-    return SongFileInfo(song_video_id, song_name, song_file_name, song_file_path, song_track_num)
+    metadata_tags = [tag for tag, value in get_metadata_dict(tags).items() if value]
+    return song_video_id, song_name, song_track_num, metadata_tags
 
 def get_song_file_infos(playlist_name):
     song_file_infos = {}
     duplicate_files = {}
-    for file_name in os.listdir(playlist_name):
-        song_file_info = get_song_file_info(playlist_name, file_name)
-        if song_file_info is None:
+
+    # Tags are only read again for files that changed since the last scan
+    for entry in LibraryIndex(playlist_name).scan(read_song_file):
+        if entry.invalid:
+            print(f"Song file '{entry.file_name}' is in an invalid format and will be ignored")
             continue
+        if entry.video_id is None:
+            continue
+
+        song_file_path = os.path.join(playlist_name, entry.file_name)
+        song_file_info = SongFileInfo(entry.video_id, entry.name, entry.file_name, song_file_path, entry.track_num, entry.metadata_tags)
 
         if song_file_info.video_id in song_file_infos:
             # Check for duplicate song files
@@ -566,12 +765,55 @@ def copy_config(src_config: dict, dst_config: dict):
         elif key in src_config and type(dst_config[key]) == type(src_config[key]):
             dst_config[key] = src_config[key]
 
-def get_override_config(video_id, base_config: dict):
-    config = copy.deepcopy(base_config)
-    if video_id in base_config["overrides"]:
-        copy_config(base_config["overrides"][video_id], config)
-
-    return config
+class SongConfig(Mapping):
+    # Read-only config of a song with its yt-dlp options built once
+    def __init__(self, config: dict):
+        self._config = {key: freeze_config_value(value) for key, value in config.items()}
+        self.song_info_ytdl_opts = MappingProxyType(build_song_info_ytdl_opts(self))
+        self.download_ytdl_opts = MappingProxyType(build_download_ytdl_opts(self, True))
+        self.download_raw_ytdl_opts = MappingProxyType(build_download_ytdl_opts(self, False))
+
+    def __getitem__(self, key):
+        return self._config[key]
+
+    def __iter__(self):
+        return iter(self._config)
+
+    def __len__(self):
+        return len(self._config)
+
+def freeze_config_value(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze_config_value(sub_value) for key, sub_value in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze_config_value(item) for item in value)
+    return value
+
+class ConfigResolver:
+    # Resolves the base config plus song overrides once per video id,
+    # songs without overrides share the same resolved config
+    def __init__(self, base_config: dict):
+        self.base_config = base_config
+        self.default_config = None
+        self.song_configs = {}
+
+    def resolve(self, overrides=None):
+        config = {key: copy.deepcopy(value) for key, value in self.base_config.items() if key != "overrides"}
+        if overrides is not None:
+            copy_config(overrides, config)
+        return SongConfig(config)
+
+    def get(self, video_id):
+        overrides = self.base_config["overrides"].get(video_id)
+        if overrides is None:
+            if self.default_config is None:
+                self.default_config = self.resolve()
+            return self.default_config
+
+        song_config = self.song_configs.get(video_id)
+        if song_config is None:
+            song_config = self.song_configs[video_id] = self.resolve(overrides)
+        return song_config
 
 def setup_config(config: dict):
     new_config = {
@@ -587,6 +829,7 @@ def setup_config(config: dict):
         "sync_folder_name": True,
         "use_threading": True,
         "thread_count": 0,
+        "transcode_thread_count": 0,
 
         "retain_missing_order": False,
         "name_format": "%(title)s-%(id)s.%(ext)s",
@@ -595,6 +838,8 @@ def setup_config(config: dict):
         "audio_codec": "wav",
         "audio_quality": "0",
         "image_format": "jpeg",
+        "cover_size": DEFAULT_COVER_SIZE,
+        "share_downloads": True,
         "lyrics_langs": [],
         "strict_lang_match": False,
         "cookie_file": "",
@@ -608,7 +853,7 @@ def setup_config(config: dict):
 
     # Create example song config override
     config_copy = copy.deepcopy(new_config)
-    excluded_override_keys = ["url", "reverse_playlist", "sync_folder_name", "use_threading", "thread_count", "overrides"]
+    excluded_override_keys = ["url", "reverse_playlist", "sync_folder_name", "use_threading", "thread_count", "transcode_thread_count", "overrides"]
     for excluded_override_key in excluded_override_keys:
         if excluded_override_key in config_copy:
             config_copy.pop(excluded_override_key)
@@ -627,6 +872,135 @@ def setup_config(config: dict):
 
     return new_config
 
+class SyncPlan:
+    # Estimated seconds per action, used to preview the cost of a sync
+    ACTION_COSTS = {
+        "downloads": 20.0,
+        "metadata_refreshes": 3.0,
+        "reorders": 0.1,
+        "removals": 0.1,
+        "no_ops": 0.0
+    }
+
+    def __init__(self):
+        # Lists of (track_num, video_id)
+        self.downloads = []
+        self.metadata_refreshes = []
+        self.reorders = []
+        self.removals = []
+        self.no_ops = []
+        self.metadata_refresh_ids = set()
+
+    def add(self, action, track_num, video_id):
+        getattr(self, action).append((track_num, video_id))
+        if action == "metadata_refreshes":
+            self.metadata_refresh_ids.add(video_id)
+
+    def is_empty(self):
+        return not (self.downloads or self.metadata_refreshes or self.reorders or self.removals)
+
+    def needs_metadata_refresh(self, video_id):
+        return video_id in self.metadata_refresh_ids
+
+    def estimated_cost(self, thread_count=1):
+        parallel_cost = sum(len(getattr(self, action)) * self.ACTION_COSTS[action] for action in ["downloads", "metadata_refreshes"])
+        serial_cost = sum(len(getattr(self, action)) * self.ACTION_COSTS[action] for action in ["reorders", "removals"])
+        return parallel_cost / max(thread_count, 1) + serial_cost
+
+    def summary(self):
+        return ", ".join([
+            f"{len(self.downloads)} to download",
+            f"{len(self.metadata_refreshes)} metadata refreshes",
+            f"{len(self.reorders)} to reorder",
+            f"{len(self.removals)} missing moved to end",
+            f"{len(self.no_ops)} unchanged"
+        ])
+
+def insert_missing_order_entries(playlist_entries, song_file_infos, configs: ConfigResolver):
+    # Insert dummy entries for songs that should retain index order
+    playlist_video_ids = {video_info["id"] for video_info in playlist_entries if video_info is not None}
+    for video_id in song_file_infos.keys():
+        config = configs.get(video_id)
+        if config["retain_missing_order"]:
+            if video_id not in playlist_video_ids:
+                # Insert dummy entry
+                index = song_file_infos[video_id].track_num - 1
+                if index > len(playlist_entries):
+                    for i in range(index - len(playlist_entries)):
+                        playlist_entries.append(None)
+                playlist_entries.insert(index, {"id": video_id, "channel_id": None, "title": None})
+
+def plan_playlist_sync(playlist_entries, song_file_infos, configs: ConfigResolver, regenerate_metadata: bool, force_update: bool):
+    # Compare the remote playlist with the local library without touching any files
+    plan = SyncPlan()
+    playlist_video_ids = set()
+
+    for i, video_info in enumerate(playlist_entries):
+        if video_info is None:
+            # Dummy spacer entry to retain index order
+            continue
+
+        track_num = i + 1
+        video_id = video_info["id"]
+        playlist_video_ids.add(video_id)
+        song_file_info = song_file_infos.get(video_id)
+
+        if song_file_info is None:
+            plan.add("downloads", track_num, video_id)
+            continue
+
+        config = configs.get(video_id)
+        changed = False
+        if needs_reorder(song_file_info, track_num, config):
+            plan.add("reorders", track_num, video_id)
+            changed = True
+
+        # Unavailable videos are refreshed to report that only a local copy exists
+        metadata_dict = {tag: tag in song_file_info.metadata_tags for tag in flatten(get_metadata_map().values())}
+        if regenerate_metadata or force_update or video_info["channel_id"] is None or not valid_metadata(config, metadata_dict):
+            plan.add("metadata_refreshes", track_num, video_id)
+            changed = True
+
+        if not changed:
+            plan.add("no_ops", track_num, video_id)
+
+    # Songs that are missing (deleted/privated/etc.) are moved to end of the list
+    track_num = len(playlist_entries) + 1
+    for video_id, song_file_info in song_file_infos.items():
+        if video_id not in playlist_video_ids:
+            config = configs.get(video_id)
+            if needs_reorder(song_file_info, track_num, config):
+                plan.add("removals", track_num, video_id)
+            else:
+                plan.add("no_ops", track_num, video_id)
+            track_num += 1
+
+    return plan
+
+def print_playlist_plan(base_config: dict, playlist_name, regenerate_metadata=False, force_update=False):
+    playlist = get_playlist_info(base_config)
+    if "entries" not in playlist:
+        raise Exception("No videos found in playlist")
+    playlist_entries = playlist["entries"]
+
+    song_file_infos = get_song_file_infos(playlist_name) # May raise exception for duplicate songs
+    configs = ConfigResolver(base_config)
+    insert_missing_order_entries(playlist_entries, song_file_infos, configs)
+    plan = plan_playlist_sync(playlist_entries, song_file_infos, configs, regenerate_metadata, force_update)
+
+    thread_count = max(base_config["thread_count"], 1) if base_config["use_threading"] else 1
+    print(f"\nPlan for '{playlist_name}': {plan.summary()}")
+    for title, action in [("Download", "downloads"), ("Refresh metadata", "metadata_refreshes"), ("Reorder", "reorders"), ("Move missing to end", "removals")]:
+        for track_num, video_id in getattr(plan, action):
+            song_file_info = song_file_infos.get(video_id)
+            name = song_file_info.name if song_file_info is not None else f"https://www.youtube.com/watch?v={video_id}"
+            if action in ["reorders", "removals"]:
+                print(f"- {title}: '{name}' from position {song_file_info.track_num} to {track_num}")
+            else:
+                print(f"- {title}: #{track_num} '{name}'")
+    print(f"Estimated time: {plan.estimated_cost(thread_count):.0f}s")
+    return plan
+
 def generate_default_config(config: dict, config_file_name: str):
     config = setup_config(config)
 
@@ -639,7 +1013,10 @@ def generate_default_config(config: dict, config_file_name: str):
 
     write_config(os.path.join(playlist_name, config_file_name), config)
 
-def generate_playlist(base_config: dict, config_file_name: str, update: bool, force_update: bool, regenerate_metadata: bool, single_playlist: bool, current_playlist_name=None, track_num_to_update=None):
+def generate_playlist(base_config: dict, config_file_name: str, update: bool, force_update: bool, regenerate_metadata: bool, single_playlist: bool, current_playlist_name=None, track_num_to_update=None, shared_pipeline=None):
+    # Playlists synced together share a pipeline and pooled sessions, which are closed by the caller
+    owns_pool = shared_pipeline is None
+
     # Get list of links in the playlist
     playlist = get_playlist_info(base_config)
     
@@ -690,167 +1067,188 @@ def generate_playlist(base_config: dict, config_file_name: str, update: bool, fo
 
     # Update config for playlist
     write_config(os.path.join(playlist_name, config_file_name), base_config)
-    song_file_infos = get_song_file_infos(playlist_name) # May raise exception for duplicate songs
-        
-    track_num = 1
-    skipped_videos = 0
-    updated_video_ids = []
-
-    # Insert dummy entries for songs that should retain index order
-    for video_id in song_file_infos.keys():
-        config = get_override_config(video_id, base_config)
-        if config["retain_missing_order"]:
-            found = False
-            for i, video_info in enumerate(playlist_entries):
-                if video_info is not None and video_info["id"] == video_id:
-                    found = True
-                    break
-            if not found:
-                # Insert dummy entry
-                index = song_file_infos[video_id].track_num - 1
-                if index > len(playlist_entries):
-                    for i in range(index - len(playlist_entries)):
-                        playlist_entries.append(None)
-                playlist_entries.insert(index, {"id": video_id, "channel_id": None, "title": None})
 
-    # Prepare threading executor
-    download_executor = None
-    update_executor = None
-    download_futures = []
-    update_futures = []
-    if base_config["use_threading"]:
-        thread_count = base_config["thread_count"]
-        if thread_count <= 0:
-            thread_count = None
-        download_executor = concurrent.futures.ThreadPoolExecutor(max_workers=thread_count)
-        update_executor = concurrent.futures.ThreadPoolExecutor(max_workers=thread_count)
-
-    # Download each item in the list
-    for i, video_info in enumerate(playlist_entries):
-        if video_info is None:
-            # Dummy spacer entry to retain index order
-            continue
-
-        track_num = i + 1 - skipped_videos
-        video_id = video_info["id"]
-        link = f"https://www.youtube.com/watch?v={video_id}"
-        song_file_info = song_file_infos.get(video_id)
+    # Stage transitions are journaled so an interrupted sync resumes where it stopped
+    journal = Journal(os.path.join(playlist_name, JOURNAL_FILE_NAME))
+    try:
+        if not journal.is_empty():
+            print("Resuming interrupted sync...")
+            # Files parked under temporary names by an interrupted reorder are moved first
+            for src, dst, err in recover_parked(journal, playlist_name):
+                print(f"Unable to restore '{src}' to '{dst}': {err}")
 
-        # Song must be downloaded already and match the current track num when updating a single song
-        if track_num_to_update is not None and (song_file_info is None or song_file_info.track_num != track_num_to_update):
-            continue
+        song_file_infos = get_song_file_infos(playlist_name) # May raise exception for duplicate songs
+        
+        track_num = 1
+        skipped_videos = 0
+        failed_track_nums = set()
+
+        # Song configs are resolved once per video id and reused by every pass below
+        configs = ConfigResolver(base_config)
+        insert_missing_order_entries(playlist_entries, song_file_infos, configs)
+
+        # Work out which songs actually need downloading, updating or reordering
+        plan = plan_playlist_sync(playlist_entries, song_file_infos, configs, regenerate_metadata, force_update)
+        if track_num_to_update is None:
+            print(f"Sync plan: {plan.summary()}")
+            if plan.is_empty():
+                journal.close(remove=True)
+                if owns_pool:
+                    shared_pool.close_all()
+                print("Playlist is already up to date.")
+                return
+
+        # Tag changes to existing songs are collected per file and saved once per sync,
+        # new downloads are saved right away so the reorder scan finds their video ids
+        tag_writer = TagWriter()
+
+        # Prepare threading pipeline, transcodes run in their own stage capped at the core count
+        pipeline = None
+        download_futures = []
+        update_futures = []
+        # Songs that failed with transient errors are downloaded again once all others are done
+        retry_songs = []
+        if shared_pipeline is not None:
+            pipeline = shared_pipeline.lanes(playlist_name)
+        elif base_config["use_threading"]:
+            pipeline = TranscodePipeline(base_config["thread_count"], base_config["transcode_thread_count"])
+            # Metadata workers share pooled connections to thumbnail and subtitle hosts
+            configure_http_session(pipeline.metadata.max_workers)
+
+        # Download each item in the list
+        for i, video_info in enumerate(playlist_entries):
+            if video_info is None:
+                # Dummy spacer entry to retain index order
+                continue
 
-        config = get_override_config(video_id, base_config)
-        updated_video_ids.append(video_id)
+            track_num = i + 1 - skipped_videos
+            video_id = video_info["id"]
+            link = f"https://www.youtube.com/watch?v={video_id}"
+            song_file_info = song_file_infos.get(video_id)
 
-        # Update metadata for a single song
-        if track_num_to_update is not None:
-            if song_file_info is not None:
-                file_path = os.path.join(playlist_name, song_file_info.file_name)
-                try:
-                    # Update all metadata but do not update the track num to avoid resorting playlist
-                    force_update_file_name = generate_metadata(file_path, link, song_file_info.track_num, playlist["title"], config, regenerate_metadata, True)
-                    force_update_file_path = os.path.join(playlist_name, force_update_file_name)
-                    if file_path != force_update_file_path:
-                        # Track name needs updating to proper format
-                        print(f"Renaming incorrect file name from '{Path(file_path).stem}' to '{Path(force_update_file_path).stem}'")
-                        os.rename(file_path, force_update_file_path)
-                except Exception as e:
-                    print(f"Unable to update metadata: {e}")
-            else:
-                print(f"Unable to update metadata for '{link}': This song has not been downloaded yet, please update the playlist first")
+            # Song must be downloaded already and match the current track num when updating a single song
+            if track_num_to_update is not None and (song_file_info is None or song_file_info.track_num != track_num_to_update):
+                continue
 
-            # Updating single song finished
-            return
+            config = configs.get(video_id)
 
-        if song_file_info is None:
-            # Download audio if not downloaded
-            print(f"Downloading '{link}'... ({track_num}/{len(playlist_entries) - skipped_videos})")
+            # Update metadata for a single song
+            if track_num_to_update is not None:
+                if song_file_info is not None:
+                    file_path = os.path.join(playlist_name, song_file_info.file_name)
+                    try:
+                        # Update all metadata but do not update the track num to avoid resorting playlist
+                        force_update_file_name = generate_metadata(file_path, link, song_file_info.track_num, playlist["title"], config, regenerate_metadata, True)
+                        force_update_file_path = os.path.join(playlist_name, force_update_file_name)
+                        if file_path != force_update_file_path:
+                            # Track name needs updating to proper format
+                            print(f"Renaming incorrect file name from '{Path(file_path).stem}' to '{Path(force_update_file_path).stem}'")
+                            os.rename(file_path, force_update_file_path)
+                    except Exception as e:
+                        print(f"Unable to update metadata: {e}")
+                else:
+                    print(f"Unable to update metadata for '{link}': This song has not been downloaded yet, please update the playlist first")
+
+                # Updating single song finished
+                if pipeline is not None:
+                    pipeline.shutdown(wait=False)
+                if owns_pool:
+                    shared_pool.close_all()
+                return
+
+            if song_file_info is None:
+                # Download audio if not downloaded
+                print(f"Downloading '{link}'... ({track_num}/{len(playlist_entries) - skipped_videos})")
             
-            if base_config["use_threading"]:
-                download_futures.append(download_executor.submit(download_song_and_update, video_info, playlist, link, playlist_name, track_num, config))
+                if pipeline is not None:
+                    download_futures.append((i, video_info, link, track_num, config, submit_song_download(pipeline, video_info, playlist, link, playlist_name, track_num, config, journal)))
+                else:
+                    error_message, _, retryable = download_song_and_update(video_info, playlist, link, playlist_name, track_num, config, journal)
+                    if error_message is not None and retryable:
+                        print(f"{error_message}, retrying at the end")
+                        retry_songs.append((i, video_info, link, track_num, config))
+                    elif error_message is not None:
+                        print(error_message)
+                        failed_track_nums.add(i + 1)
+                        skipped_videos += 1
             else:
-                error_message, _ = download_song_and_update(video_info, playlist, link, playlist_name, track_num, config)
-                if error_message is not None:
-                    print(error_message)
-                    skipped_videos += 1
-        else:
-            # Skip downloading audio if already downloaded
-            print(f"Skipped downloading '{link}' ({track_num}/{len(playlist_entries) - skipped_videos})")
+                # Skip downloading audio if already downloaded
+                print(f"Skipped downloading '{link}' ({track_num}/{len(playlist_entries) - skipped_videos})")
 
-            if base_config["use_threading"]:
-                # Defer updating track num when using threading
+                # Track nums and file names are updated in one batch at the end
                 file_path = os.path.join(playlist_name, song_file_info.file_name)
-            else:
-                # Update track num and get file path
-                file_path = update_file_order(playlist_name, song_file_info, track_num, config, False)
 
-            # Generate metadata just in case it is missing
-            if base_config["use_threading"]:
-                update_futures.append(update_executor.submit(update_song, video_info, song_file_info, file_path, link, track_num, playlist["title"], config, regenerate_metadata, force_update))
-            else:
-                error_message = update_song(video_info, song_file_info, file_path, link, track_num, playlist["title"], config, regenerate_metadata, force_update)
+                if not plan.needs_metadata_refresh(video_id):
+                    # Metadata is complete according to the library index
+                    continue
+
+                # Generate metadata just in case it is missing
+                if pipeline is not None:
+                    update_futures.append(pipeline.metadata.submit(update_song, video_info, song_file_info, file_path, link, track_num, playlist["title"], config, regenerate_metadata, force_update, tag_writer))
+                else:
+                    error_message = update_song(video_info, song_file_info, file_path, link, track_num, playlist["title"], config, regenerate_metadata, force_update, tag_writer)
+                    if error_message is not None:
+                        print(error_message)
+
+        # Wait for downloads and updates when using threading
+        if pipeline is not None:
+            # Gather all results in order of submission
+            for i, video_info, link, track_num, config, task in download_futures:
+                error_message, _, retryable = task.result()
+                if error_message is not None and retryable:
+                    print(f"{error_message}, retrying at the end")
+                    retry_songs.append((i, video_info, link, track_num, config))
+                elif error_message is not None:
+                    print(error_message)
+                    failed_track_nums.add(i + 1)
+
+            for index, task in enumerate(update_futures):
+                error_message = task.result()
                 if error_message is not None:
                     print(error_message)
 
-    # Update track nums after download and update when using threading
-    if base_config["use_threading"]:
-        results = []
-
-        # Gather all results in order of submission
-        for index, task in enumerate(download_futures):
-            error_message, track_num = task.result()
-            results.append((error_message, track_num))
-            if error_message is not None:
-                print(error_message)
-
-        for index, task in enumerate(update_futures):
-            error_message = task.result()
-            if error_message is not None:
-                print(error_message)
-
-        # Explicitly shutdown executors
-        download_executor.shutdown(wait=False)
-        update_executor.shutdown(wait=False)
-
-        # Get all new temporary song file infos for existing and newly downloaded songs and update
-        skipped_track_nums = [track_num for (error_message, track_num) in results if error_message is not None]
-        temp_song_file_infos = get_song_file_infos(playlist_name) # May raise exception for duplicate songs
-        for i, video_info in enumerate(playlist_entries):
-            if video_info is None:
-                # Dummy spacer entry to retain index order
-                continue
+            # Explicitly shutdown executors
+            pipeline.shutdown(wait=False)
 
-            # Skip videos that failed to download
-            original_track_num = i + 1
-            track_num = original_track_num - skipped_videos
-            if original_track_num in skipped_track_nums:
-                skipped_videos += 1
-                continue
-
-            video_id = video_info["id"]
-            temp_song_file_info = temp_song_file_infos.get(video_id)
-            if temp_song_file_info is not None:
-                # Update file path and track num
-                config = get_override_config(video_id, base_config)
-                file_path = update_file_order(playlist_name, temp_song_file_info, track_num, config, False)
-
-    # Song not found for single song update
-    if track_num_to_update is not None:
-        print(f"Unable to update metadata for song #{track_num_to_update}: This song could not be found or is unavailable, please update the playlist first")
-        return
+        # Retry one song at a time so a throttled endpoint is not hit by every worker again
+        if retry_songs:
+            print(f"Retrying {len(retry_songs)} songs that failed with temporary errors...")
+            for i, video_info, link, track_num, config in retry_songs:
+                print(f"Downloading '{link}'...")
+                error_message, _, _ = download_song_and_update(video_info, playlist, link, playlist_name, track_num, config, journal)
+                if error_message is not None:
+                    print(error_message)
+                    failed_track_nums.add(i + 1)
 
-    # Move songs that are missing (deleted/privated/etc.) to end of the list
-    track_num = len(playlist_entries) - skipped_videos + 1
-    for video_id in song_file_infos.keys():
-        if video_id not in updated_video_ids:
-            # Update file path and track num
-            config = get_override_config(video_id, base_config)
-            song_file_info = song_file_infos[video_id]
-            file_path = update_file_order(playlist_name, song_file_info, track_num, config, True)
-            track_num += 1
+        # Song not found for single song update
+        if track_num_to_update is not None:
+            print(f"Unable to update metadata for song #{track_num_to_update}: This song could not be found or is unavailable, please update the playlist first")
+            if owns_pool:
+                shared_pool.close_all()
+            return
 
-    print("Download finished.")
+        # Update track nums and file names of existing, newly downloaded and missing songs
+        file_paths = reorder_playlist(playlist_name, get_song_positions(playlist_entries, song_file_infos, failed_track_nums), configs, tag_writer, journal)
+
+        # Only partial downloads of songs still in the playlist are kept for the next sync to resume
+        playlist_video_ids = {video_info["id"] for video_info in playlist_entries if video_info is not None}
+        journal.compact(lambda video_id, entry: entry["stage"] in (DOWNLOADED, TRANSCODED) and video_id in playlist_video_ids
+                        and os.path.exists(os.path.join(playlist_name, os.path.basename(entry["path"]))))
+
+        # Index the songs of this playlist so other playlists can copy them
+        shared_songs = [(video_id, get_settings_key(configs.get(video_id)), file_path) for video_id, file_path in file_paths.items() if configs.get(video_id)["share_downloads"]]
+        if shared_songs:
+            shared_content_store.add_all(shared_songs)
+            if owns_pool:
+                print(f"Songs from other playlists: {shared_content_store.stats()}")
+
+        # Save cookies and release pooled YoutubeDL instances
+        if owns_pool:
+            shared_pool.close_all()
+        print("Download finished.")
+    finally:
+        # Also closed when the sync fails, e.g. on duplicate songs or a failed rename
+        journal.close()
 
 def get_existing_playlists(directory: str, config_file_name: str):
     playlists_data = []
@@ -960,7 +1358,71 @@ def get_numeric_option_response(prompt):
 
     return index
 
+def print_playlist_plans(config_file_name: str, single_playlist: bool):
+    if single_playlist:
+        playlists_data = [{"playlist_name": ".", "config_file": config_file_name}]
+    else:
+        playlists_data = get_existing_playlists(".", config_file_name)
+
+    for playlist_data in playlists_data:
+        try:
+            with open(playlist_data["config_file"], "r") as f:
+                config = setup_config(json.load(f))
+            print_playlist_plan(config, playlist_data["playlist_name"])
+        except Exception as e:
+            print(f"Unable to plan playlist '{playlist_data['playlist_name']}': {e}")
+
+def sync_all_playlists(config_file_name: str, single_playlist: bool, thread_count: int, transcode_thread_count: int):
+    # Updates every saved playlist at once. Songs of all playlists share one download budget
+    # and one transcode budget, which take work from each playlist in turn, so a large
+    # playlist does not hold up the small ones.
+    if single_playlist:
+        playlists_data = [{"playlist_name": os.path.basename(os.getcwd()), "config_file": config_file_name}]
+    else:
+        playlists_data = get_existing_playlists(".", config_file_name)
+    if len(playlists_data) == 0:
+        print("No saved playlists found.")
+        return
+
+    pipeline = SharedTranscodePipeline(thread_count, transcode_thread_count)
+    configure_http_session(pipeline.metadata.max_workers)
+    print(f"Syncing {len(playlists_data)} playlists [{pipeline.depths()}]")
+
+    def sync_playlist(playlist_data):
+        with open(playlist_data["config_file"], "r") as f:
+            config = setup_config(json.load(f))
+        generate_playlist(config, config_file_name, True, False, False, single_playlist, playlist_data["playlist_name"], None, pipeline)
+
+    start_time = time.time()
+    failed_playlists = []
+    # One coordinator thread per playlist, they mostly wait on the shared stages, whose
+    # fair queues bound the actual work, so every playlist is queued from the start
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(playlists_data)) as executor:
+        futures = {executor.submit(sync_playlist, playlist_data): playlist_data["playlist_name"] for playlist_data in playlists_data}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+                print(f"Finished syncing playlist '{futures[future]}'")
+            except Exception as e:
+                print(f"Unable to sync playlist '{futures[future]}': {e}")
+                failed_playlists.append(futures[future])
+
+    pipeline.shutdown()
+    # Save cookies and release pooled YoutubeDL instances
+    shared_pool.close_all()
+    print(f"Synced {len(playlists_data) - len(failed_playlists)}/{len(playlists_data)} playlists in {time.time() - start_time:.1f}s.")
+    print(f"Songs from other playlists: {shared_content_store.stats()}")
+    if failed_playlists:
+        print("Failed playlists:\n" + "\n".join("- " + playlist_name for playlist_name in failed_playlists))
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="YouTube Music Playlist Downloader")
+    parser.add_argument("--plan", action="store_true", help="print what updating saved playlists would do without changing anything")
+    parser.add_argument("--sync-all", action="store_true", help="update every saved playlist at once without prompting")
+    parser.add_argument("--threads", type=int, default=0, help="download workers shared by all playlists with --sync-all (default: automatic)")
+    parser.add_argument("--transcode-threads", type=int, default=0, help="ffmpeg workers shared by all playlists with --sync-all (default: number of cores)")
+    args = parser.parse_args()
+
     print("\n".join([
         "YouTube Music Playlist Downloader v" + version,
         "-----------------------------------------------------------",
@@ -994,6 +1456,16 @@ if __name__ == "__main__":
     if single_playlist:
         print(f"Current folder detected as a playlist. Running in single playlist mode.\nIf you did not expect this, please remove '{config_file_name}' from this folder.")
 
+    if args.plan:
+        print_playlist_plans(config_file_name, single_playlist)
+        sys.exit()
+
+    if args.sync_all:
+        if not check_ffmpeg():
+            sys.exit(1)
+        sync_all_playlists(config_file_name, single_playlist, args.threads, args.transcode_threads)
+        sys.exit()
+
     while True:
         try:
             check_ffmpeg()
@@ -1,46 +1,99 @@
 #!/usr/bin/env python3
 import json
 import os
-import time
-import threading
-from queue import Queue
-from typing import Dict, Optional, List
+from typing import Callable, Dict, Optional, List, Tuple
 from youtube_search import YoutubeSearch
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from rate_limiter import TokenBucketRateLimiter
+from search_cache import SearchCache, DEFAULT_CACHE_FILE
+from journal import Journal, RESOLVED
+from resilience import SEARCH_ENDPOINT, RetryQueue, call_with_retry, is_transient
 import argparse
 
 class YouTubeSearcher:
     """Searches YouTube for songs and updates JSON with video IDs."""
     
-    def __init__(self, json_file: str, max_threads: int = 3):
+    def __init__(self, json_file: Optional[str] = None, max_threads: int = 3,
+                 requests_per_second: float = 1.0, burst: int = 1,
+                 max_in_flight: Optional[int] = None,
+                 cache: Optional[SearchCache] = None, refresh: bool = False,
+                 progress: Optional[Callable[[str, str], None]] = None,
+                 journal: Optional[Journal] = None):
         self.json_file = json_file
         self.max_threads = max_threads
-        self.lock = threading.Lock()
-        self.rate_limit_delay = 1.0  # Delay between searches in seconds
-        self.last_search_time = time.time()
+        self.cache = cache
+        self.refresh = refresh
+        self.progress = progress
+        self.journal = journal
+        self.rate_limiter = TokenBucketRateLimiter(
+            rate=requests_per_second,
+            burst=burst,
+            max_in_flight=max_in_flight or max_threads
+        )
     
+    def _search_once(self, song_name: str) -> Optional[str]:
+        """
+        Performs a single rate-limited YouTube search.
+        The rate limiter only hands out request slots, so searches from
+        different threads overlap their network latency.
+        """
+        with self.rate_limiter.slot():
+            results = YoutubeSearch(song_name, max_results=1).to_dict()
+        if results:
+            return results[0]['id']
+        return None
+
     def _rate_limited_search(self, song_name: str) -> Optional[str]:
         """
-        Performs rate-limited YouTube search.
-        Uses a lock to ensure proper timing between searches across threads.
+        Performs rate-limited YouTube search, retrying transient errors with backoff.
+        Transient errors are raised once retries run out, other errors are
+        printed and treated as not found.
+        """
+        try:
+            return call_with_retry(SEARCH_ENDPOINT, self._search_once, song_name)
+        except Exception as e:
+            if is_transient(e):
+                raise
+            print(f"Error searching for '{song_name}': {e}")
+            return None
+
+    def search_song(self, song_name: str) -> Optional[str]:
+        """
+        Returns the YouTube ID for a song name or None if it was not found.
+        Looks the song up in the journal of an interrupted run and the search
+        cache before searching YouTube. With refresh enabled the cache is
+        bypassed but still updated. Resolved IDs are journaled as they arrive.
+        Transient errors that persist after retrying are raised.
         """
-        with self.lock:
-            # Calculate time to wait
-            current_time = time.time()
-            time_since_last = current_time - self.last_search_time
-            if time_since_last < self.rate_limit_delay:
-                time.sleep(self.rate_limit_delay - time_since_last)
-            
+        video_id = None
+        if self.journal is not None:
+            entry = self.journal.get(song_name)
+            if entry is not None:
+                video_id = entry.get('youtube_id')
+
+        if video_id is None and self.cache is not None and not self.refresh:
+            video_id = self.cache.get(song_name)
+
+        if video_id is None:
+            self._report(song_name, "searching")
             try:
-                results = YoutubeSearch(song_name, max_results=1).to_dict()
-                self.last_search_time = time.time()
-                
-                if results:
-                    return results[0]['id']
-                return None
-            except Exception as e:
-                print(f"Error searching for '{song_name}': {e}")
-                return None
+                video_id = self._rate_limited_search(song_name)
+            except Exception:
+                self._report(song_name, "not_found")
+                raise
+            if video_id is not None and self.cache is not None:
+                self.cache.put(song_name, video_id)
+
+        if video_id is not None and self.journal is not None and self.journal.get(song_name) is None:
+            self.journal.record(song_name, RESOLVED, youtube_id=video_id)
+
+        self._report(song_name, "resolved" if video_id is not None else "not_found")
+        return video_id
+
+    def _report(self, song_name: str, state: str) -> None:
+        """Passes a song's search state to the progress callback, if any."""
+        if self.progress is not None:
+            self.progress(song_name, state)
 
     def _search_worker(self, song: Dict[str, str]) -> tuple[str, str, bool]:
         """
@@ -48,10 +101,65 @@ class YouTubeSearcher:
         Returns tuple of (song_name, video_id, success_status)
         """
         song_name = song['name']
-        video_id = self._rate_limited_search(song_name)
+        video_id = self.search_song(song_name)
         success = video_id is not None
         return (song_name, video_id, success)
 
+    def search_songs(self, songs: List[Dict[str, str]]) -> Tuple[int, List[str]]:
+        """
+        Searches YouTube for songs in memory using parallel processing.
+        Sets 'youtube_id' on each song found and returns (songs_updated, failed_song_names).
+        Searches that failed with transient errors are run once more after all others.
+        """
+        retry_queue = RetryQueue()
+        songs_updated, failed_songs = self._search_all(songs, retry_queue)
+
+        retry_songs = retry_queue.drain()
+        if retry_songs:
+            print(f"Retrying {len(retry_songs)} searches that failed temporarily...")
+            retried, still_failed = self._search_all(retry_songs, None)
+            songs_updated += retried
+            failed_songs.extend(still_failed)
+
+        return songs_updated, failed_songs
+
+    def _search_all(self, songs: List[Dict[str, str]],
+                    retry_queue: Optional[RetryQueue]) -> Tuple[int, List[str]]:
+        """Runs one round of searches, queueing transient failures in retry_queue if given."""
+        songs_updated = 0
+        failed_songs = []
+
+        # Process songs in parallel using ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.max_threads) as executor:
+            # Submit all songs for processing
+            future_to_song = {
+                executor.submit(self._search_worker, song): song
+                for song in songs
+            }
+
+            # Process completed searches
+            for future in as_completed(future_to_song):
+                try:
+                    song_name, video_id, success = future.result()
+                except Exception as e:
+                    song = future_to_song[future]
+                    if retry_queue is None or not is_transient(e):
+                        print(f"Error searching for '{song['name']}': {e}")
+                        failed_songs.append(song['name'])
+                    else:
+                        print(f"Search for '{song['name']}' failed temporarily, retrying at the end: {e}")
+                        retry_queue.add(song)
+                    continue
+                
+                if success:
+                    future_to_song[future]['youtube_id'] = video_id
+                    songs_updated += 1
+                    print(f"Found YouTube ID for: {song_name}")
+                else:
+                    failed_songs.append(song_name)
+
+        return songs_updated, failed_songs
+
     def update_json_with_ids(self) -> None:
         """Updates the JSON file with YouTube video IDs using parallel processing."""
         try:
@@ -75,31 +183,7 @@ class YouTubeSearcher:
             return
 
         print(f"Processing {len(songs_to_process)} songs with {self.max_threads} threads...")
-        songs_updated = 0
-        failed_songs = []
-
-        # Process songs in parallel using ThreadPoolExecutor
-        with ThreadPoolExecutor(max_workers=self.max_threads) as executor:
-            # Submit all songs for processing
-            future_to_song = {
-                executor.submit(self._search_worker, song): song
-                for song in songs_to_process
-            }
-
-            # Process completed searches
-            for future in as_completed(future_to_song):
-                song_name, video_id, success = future.result()
-                
-                if success:
-                    # Update the original data structure
-                    for song in data['songs']:
-                        if song['name'] == song_name:
-                            song['youtube_id'] = video_id
-                            songs_updated += 1
-                            print(f"Found YouTube ID for: {song_name}")
-                            break
-                else:
-                    failed_songs.append(song_name)
+        songs_updated, failed_songs = self.search_songs(songs_to_process)
 
         # Save updated JSON without BOM
         with open(self.json_file, 'w', encoding='utf-8') as f:
@@ -108,6 +192,8 @@ class YouTubeSearcher:
         # Print summary
         print(f"\nSearch Results Summary:")
         print(f"- Successfully updated: {songs_updated} songs")
+        if self.cache is not None:
+            print(f"- Search cache: {self.cache.stats()}")
         if failed_songs:
             print(f"- Failed to find: {len(failed_songs)} songs")
             print("\nFailed songs:")
@@ -120,14 +206,36 @@ def main():
                         help='Input JSON file path')
     parser.add_argument('-t', '--threads', type=int, default=3,
                         help='Maximum number of concurrent threads (default: 3)')
+    parser.add_argument('-r', '--rate', type=float, default=1.0,
+                        help='Maximum searches per second (default: 1.0)')
+    parser.add_argument('-b', '--burst', type=int, default=1,
+                        help='Number of searches allowed back-to-back before throttling (default: 1)')
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help='Maximum number of searches waiting on YouTube at once (default: number of threads)')
+    parser.add_argument('--cache-file', type=str, default=DEFAULT_CACHE_FILE,
+                        help=f'Search cache file (default: {DEFAULT_CACHE_FILE})')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Disable the search cache')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Ignore cached results and search YouTube again')
     args = parser.parse_args()
     
     if not os.path.exists(args.file):
         print(f"Error: {args.file} not found!")
         return
     
-    searcher = YouTubeSearcher(args.file, max_threads=args.threads)
+    cache = None if args.no_cache else SearchCache(args.cache_file)
+    # IDs found before an interrupted run are reused from its journal, which is kept apart
+    # from the journal of a controller run writing the same file
+    journal = Journal(f"{args.file}.search.journal")
+    searcher = YouTubeSearcher(args.file, max_threads=args.threads,
+                               requests_per_second=args.rate, burst=args.burst,
+                               max_in_flight=args.max_in_flight,
+                               cache=cache, refresh=args.refresh, journal=journal)
     searcher.update_json_with_ids()
+    journal.close(remove=True)
+    if cache is not None:
+        cache.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
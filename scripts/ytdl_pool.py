@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+import json
+import itertools
+import threading
+import time
+import weakref
+from typing import Callable, Dict, List, Optional, Tuple
+from yt_dlp import YoutubeDL, postprocessor
+from yt_dlp.utils import DownloadError
+
+
+class FilePathCollector(postprocessor.common.PostProcessor):
+    """Collects file paths and info dicts during YouTube download processing."""
+
+    def __init__(self):
+        super(FilePathCollector, self).__init__(None)
+        self.file_paths = []
+        self.info_dicts = []
+
+    def run(self, information):
+        self.file_paths.append(information['filepath'])
+        self.info_dicts.append(information)
+        return [], information
+
+
+class ErrorRecordingYoutubeDL(YoutubeDL):
+    """
+    YoutubeDL that keeps the errors it reports, including those ignored by ignoreerrors.
+    Every reported error is a failure that YoutubeDL.download() would count in its
+    return code, so sessions derive a per-call return code from them.
+    """
+
+    def __init__(self, options: dict):
+        super().__init__(options)
+        self.errors: List[str] = []
+
+    def trouble(self, message=None, tb=None, is_error=True):
+        if is_error:
+            self.errors.append(message or "Unknown error")
+        return super().trouble(message, tb, is_error)
+
+
+# Receives download events such as ("bytes", {"downloaded_bytes": ..., "total_bytes": ...})
+DownloadListener = Callable[..., None]
+
+# Minimum seconds between byte progress events for a download
+BYTES_EVENT_INTERVAL = 0.5
+
+
+class YoutubeDLSession:
+    """A reusable YoutubeDL instance with its own file path collector."""
+
+    def __init__(self, options: dict):
+        self.ytdl = ErrorRecordingYoutubeDL(options)
+        self.default_outtmpl = self.ytdl.params['outtmpl']['default']
+        self.collector = FilePathCollector()
+        self.ytdl.add_post_processor(self.collector)
+        self.listener: Optional[DownloadListener] = None
+        self.last_bytes_event = 0.0
+        self.ytdl.add_progress_hook(self._progress_hook)
+        self.ytdl.add_postprocessor_hook(self._postprocessor_hook)
+
+    def _progress_hook(self, status: dict) -> None:
+        """Forwards throttled byte counts to the listener of the current call."""
+        if self.listener is None:
+            return
+        now = time.monotonic()
+        if status.get('status') == 'downloading' and now - self.last_bytes_event < BYTES_EVENT_INTERVAL:
+            return
+        self.last_bytes_event = now
+        self.listener("bytes",
+                      downloaded_bytes=status.get('downloaded_bytes'),
+                      total_bytes=status.get('total_bytes') or status.get('total_bytes_estimate'))
+
+    def _postprocessor_hook(self, status: dict) -> None:
+        """Reports audio extraction to the listener of the current call."""
+        if self.listener is not None and status.get('postprocessor') == 'ExtractAudio' and status.get('status') == 'started':
+            self.listener("transcoding")
+
+    def set_outtmpl(self, outtmpl: str = None) -> None:
+        """Sets the output template used by the next call."""
+        self.ytdl.params['outtmpl']['default'] = outtmpl or self.default_outtmpl
+
+    def download(self, link: str, listener: DownloadListener = None) -> Tuple[int, List[str], List[dict]]:
+        """
+        Downloads a link and returns the result, the paths of the files produced
+        and their post-processed info dicts. The listener receives progress events.
+        Raises a DownloadError with the last error reported if no file was produced.
+        """
+        self.ytdl.errors = []
+        self.collector.file_paths = []
+        self.collector.info_dicts = []
+        self.listener = listener
+        self.last_bytes_event = 0.0
+        try:
+            # The return code of YoutubeDL.download() is cumulative per instance,
+            # the result of this call is taken from the errors it reported instead
+            self.ytdl.download([link])
+        finally:
+            self.listener = None
+        if not self.collector.file_paths and self.ytdl.errors:
+            # Errors are only printed with ignoreerrors, raise them so callers can tell why
+            raise DownloadError(self.ytdl.errors[-1])
+        result = 1 if self.ytdl.errors else 0
+        return result, self.collector.file_paths, self.collector.info_dicts
+
+    def close(self) -> None:
+        self.ytdl.close()
+
+
+class ThreadSessions(dict):
+    """Sessions of one thread by options key, a dict subclass so it can be weakly referenced."""
+
+
+class YoutubeDLPool:
+    """
+    Shares YoutubeDL instances between calls that use identical options.
+
+    YoutubeDL is not thread-safe, so each thread keeps its own set of sessions.
+    The output template is excluded from the session key and applied per call.
+    A thread's sessions are closed when the thread exits, so pipelines that
+    start new worker threads for every run do not accumulate sessions.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Sessions of every live thread, by a token identifying the thread's ThreadSessions
+        self._sessions: Dict[int, List[YoutubeDLSession]] = {}
+        self._tokens = itertools.count()
+        self.created = 0
+        self.reused = 0
+
+    def _thread_sessions(self) -> ThreadSessions:
+        sessions = getattr(self._local, "sessions", None)
+        if sessions is None:
+            sessions = self._local.sessions = ThreadSessions()
+            token = next(self._tokens)
+            with self._lock:
+                self._sessions[token] = []
+            # Thread-local values are released when their thread exits
+            weakref.finalize(sessions, self._release, token)
+            sessions.token = token
+        return sessions
+
+    def _release(self, token: int) -> None:
+        """Closes the sessions of a thread that exited, unless close_all() already did."""
+        with self._lock:
+            sessions = self._sessions.pop(token, [])
+        for session in sessions:
+            session.close()
+
+    def live_sessions(self) -> int:
+        with self._lock:
+            return sum(len(sessions) for sessions in self._sessions.values())
+
+    @staticmethod
+    def _key(options: dict) -> str:
+        return json.dumps({key: value for key, value in options.items() if key != "outtmpl"},
+                          sort_keys=True, default=repr)
+
+    def session(self, options: dict) -> YoutubeDLSession:
+        """Returns this thread's session for the options, with the output template applied."""
+        sessions = self._thread_sessions()
+
+        key = self._key(options)
+        session = sessions.get(key)
+        if session is None:
+            session = YoutubeDLSession({key: value for key, value in options.items() if key != "outtmpl"})
+            sessions[key] = session
+            with self._lock:
+                self._sessions.setdefault(sessions.token, []).append(session)
+                self.created += 1
+        else:
+            with self._lock:
+                self.reused += 1
+
+        session.set_outtmpl(options.get("outtmpl"))
+        return session
+
+    def get(self, options: dict) -> YoutubeDL:
+        """Returns this thread's YoutubeDL instance for the options."""
+        return self.session(options).ytdl
+
+    def download(self, options: dict, link: str,
+                 listener: DownloadListener = None) -> Tuple[int, List[str], List[dict]]:
+        """Downloads a link with a pooled session."""
+        return self.session(options).download(link, listener)
+
+    def close_all(self) -> None:
+        """Closes every session, saving cookies where configured."""
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for thread_sessions in sessions.values():
+            for session in thread_sessions:
+                session.close()
+        self._local = threading.local()
+
+
+shared_pool = YoutubeDLPool()